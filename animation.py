@@ -0,0 +1,155 @@
+import heapq
+import threading
+from collections import deque
+
+from timing import host_now_ns
+
+# Rendered frames kept for the statistics
+FRAME_STATS_SIZE = 600
+
+
+class FontCache:
+    """
+        Fonts built once and shared.
+
+        Configuring a label with a cached font only switches the font, creating a
+        new font object every time makes Tk measure and allocate it again.
+    """
+
+    def __init__(self, factory):
+        """
+            :param factory: Callable(size, weight) building a font, called once per size and weight.
+        """
+        self.factory = factory
+        self.fonts = {}
+
+    def get(self, size, weight="bold"):
+        key = (size, weight)
+        font = self.fonts.get(key)
+        if font is None:
+            font = self.fonts[key] = self.factory(size, weight)
+        return font
+
+    def preload(self, sizes, weight="bold"):
+        for size in sizes:
+            self.get(size, weight)
+
+
+class FrameStats:
+    """
+        Latency and render time of the keyframes shown by a timeline.
+
+        Latency is the time from when a keyframe was due until Tk finished drawing
+        it, render time is how long its actions and the redraw took.
+    """
+
+    def __init__(self, frame_ns, size=FRAME_STATS_SIZE):
+        self.frame_ns = frame_ns
+        self.samples = deque(maxlen=size)
+        self.latest = {}
+
+    def add(self, name, latency_ns, render_ns):
+        self.samples.append((latency_ns, render_ns))
+        if name is not None:
+            self.latest[name] = latency_ns
+
+    def summary(self):
+        """ :return: Dictionary of statistics in milliseconds, None without samples. """
+        if not self.samples:
+            return None
+        latencies = sorted(latency for latency, _ in self.samples)
+        renders = [render for _, render in self.samples]
+        return {
+            "frames": len(latencies),
+            "frame_budget_ms": self.frame_ns / 1e6,
+            "latency_mean_ms": sum(latencies) / len(latencies) / 1e6,
+            "latency_p95_ms": latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] / 1e6,
+            "latency_max_ms": latencies[-1] / 1e6,
+            "render_max_ms": max(renders) / 1e6,
+            "late_frames": sum(1 for latency in latencies if latency > self.frame_ns),
+        }
+
+    def report(self):
+        summary = self.summary()
+        if summary is None:
+            return "No frames rendered"
+        return (f"{summary['frames']} frames, latency mean {summary['latency_mean_ms']:.1f} ms, "
+                f"p95 {summary['latency_p95_ms']:.1f} ms, max {summary['latency_max_ms']:.1f} ms, "
+                f"render max {summary['render_max_ms']:.1f} ms, "
+                f"{summary['late_frames']} later than one frame ({summary['frame_budget_ms']:.1f} ms)")
+
+
+class AnimationTimeline:
+    """
+        Runs keyframes at given times of the host monotonic clock on the Tk event loop.
+
+        Keyframes are scheduled against timing.host_now_ns, the clock serial frames
+        are stamped with on arrival, so an animation can be anchored to the frame
+        that triggered it rather than to when the UI got around to it. The timer
+        is armed with after() for the next keyframe only, nothing runs while idle.
+    """
+
+    def __init__(self, widget, frame_rate=60):
+        self.widget = widget
+        self.frame_ns = int(1_000_000_000 / frame_rate)
+        self.lock = threading.Lock()
+        self.keyframes = []
+        self.sequence = 0
+        self.timer = None
+        self.stats = FrameStats(self.frame_ns)
+
+    def schedule(self, due_ns, action, name=None, group=None, on_shown=None):
+        """
+            Runs action on the Tk thread at due_ns, may be called from any thread.
+
+            :param due_ns: host_now_ns time the keyframe should be on screen, past times run at once.
+            :param action: Callable updating widgets.
+            :param name: Name the keyframe's latency is recorded under.
+            :param group: Group the keyframe can be cancelled with.
+            :param on_shown: Callable run once the keyframe is drawn and its latency recorded.
+        """
+        with self.lock:
+            self.sequence += 1
+            heapq.heappush(self.keyframes, (due_ns, self.sequence, action, name, group, on_shown))
+        self.widget.after(0, self.wake)
+
+    def cancel(self, group=None):
+        """ Drops the keyframes of a group not shown yet, every keyframe if group is None """
+        with self.lock:
+            if group is None:
+                self.keyframes = []
+            else:
+                self.keyframes = [keyframe for keyframe in self.keyframes if keyframe[4] != group]
+                heapq.heapify(self.keyframes)
+
+    def wake(self):
+        if self.timer is not None:
+            self.widget.after_cancel(self.timer)
+            self.timer = None
+        self.tick()
+
+    def tick(self):
+        self.timer = None
+        now = host_now_ns()
+        due = []
+        with self.lock:
+            # a keyframe within half a frame lands on the nearest frame either way
+            while self.keyframes and self.keyframes[0][0] <= now + self.frame_ns // 2:
+                due.append(heapq.heappop(self.keyframes))
+            next_due = self.keyframes[0][0] if self.keyframes else None
+
+        if due:
+            for keyframe in due:
+                keyframe[2]()
+            # draw now instead of when the event loop is next idle, so the latency is what the screen shows
+            self.widget.update_idletasks()
+            shown = host_now_ns()
+            for due_ns, _, _, name, _, _ in due:
+                self.stats.add(name, shown - due_ns, shown - now)
+            for keyframe in due:
+                if keyframe[5] is not None:
+                    keyframe[5]()
+
+        if next_due is not None:
+            delay_ms = max((next_due - self.frame_ns // 2 - host_now_ns()) // 1_000_000, 0)
+            self.timer = self.widget.after(delay_ms, self.tick)
@@ -0,0 +1,245 @@
+import argparse
+import csv
+import glob
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+from settings import get_settings
+
+# Tables exported, results first
+EXPORT_TABLES = ("player_data", "race_session_info")
+
+EXPORT_FORMATS = ("csv", "jsonl")
+
+
+class BackupCancelled(Exception):
+    pass
+
+
+def open_snapshot(db_path):
+    """
+        Opens a read-only connection holding a read transaction.
+
+        In WAL mode the transaction pins a consistent snapshot of the database, so
+        commits from the writer thread (or another process) neither block it nor
+        restart a backup in progress, and the reader never blocks them.
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, isolation_level=None,
+                           check_same_thread=False)
+    conn.execute("BEGIN")
+    conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+    return conn
+
+
+def backup_name(db_path, now=None):
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    return f"{stem}-{(now or datetime.now()).strftime('%Y%m%d-%H%M%S')}.db"
+
+
+def backup_database(db_path, directory, pages_per_step, step_pause, stop_event=None):
+    """
+        Copies the database page by page with sqlite's online backup API.
+
+        The copy is written to a temporary file and renamed once it is complete and
+        passes a quick check, so an interrupted backup never looks like a good one.
+
+        :param pages_per_step: Pages copied per step, the read lock is only held per step.
+        :param step_pause: Seconds slept between steps.
+        :param stop_event: Event cancelling the backup between two steps.
+        :return: Path of the backup.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, backup_name(db_path))
+    temporary_path = path + ".partial"
+    started = time.perf_counter()
+    steps = 0
+
+    def progress(status, remaining, total):
+        nonlocal steps
+        steps += 1
+        # Connection.backup only sleeps after a busy step, the pause between steps is done here
+        if remaining and step_pause:
+            if stop_event is not None:
+                stop_event.wait(step_pause)
+            else:
+                time.sleep(step_pause)
+        if stop_event is not None and stop_event.is_set():
+            raise BackupCancelled()
+
+    source = open_snapshot(db_path)
+    target = sqlite3.connect(temporary_path)
+    try:
+        source.backup(target, pages=max(int(pages_per_step), 1), progress=progress)
+        check = target.execute("PRAGMA quick_check").fetchone()[0]
+        if check != "ok":
+            raise sqlite3.DatabaseError(f"Backup failed its quick check: {check}")
+        pages = target.execute("PRAGMA page_count").fetchone()[0]
+    except BaseException:
+        target.close()
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+    finally:
+        source.close()
+
+    target.close()
+    os.replace(temporary_path, path)
+    print(f"Backed up {db_path} to {path}: {pages} pages in {steps} steps, "
+          f"{time.perf_counter() - started:.2f}s")
+    return path
+
+
+def prune_backups(db_path, directory, keep):
+    """ Deletes the oldest backups of the database beyond the newest keep """
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    backups = sorted(glob.glob(os.path.join(directory, f"{stem}-*.db")))
+    for path in backups[:max(len(backups) - keep, 0)]:
+        os.remove(path)
+
+
+def export_tables(db_path, directory, export_format="csv", rows_per_step=500, step_pause=0.0,
+                  tables=EXPORT_TABLES):
+    """
+        Streams tables into gzip compressed CSV or JSON lines files.
+
+        Rows are fetched rows_per_step at a time from one snapshot, so the tables are
+        consistent with each other and never held in memory as a whole.
+
+        :return: Dictionary of table name to (path, rows written).
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format}, expected one of {EXPORT_FORMATS}")
+
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    exported = {}
+
+    conn = open_snapshot(db_path)
+    try:
+        for table in tables:
+            path = os.path.join(directory, f"{table}-{stamp}.{export_format}.gz")
+            cursor = conn.execute(f"SELECT * FROM {table} ORDER BY id")
+            columns = [description[0] for description in cursor.description]
+            rows = 0
+
+            with gzip.open(path, "wt", encoding="utf-8", newline="") as export_file:
+                csv_writer = csv.writer(export_file) if export_format == "csv" else None
+                if csv_writer is not None:
+                    csv_writer.writerow(columns)
+
+                while True:
+                    batch = cursor.fetchmany(rows_per_step)
+                    if not batch:
+                        break
+                    if csv_writer is not None:
+                        csv_writer.writerows(batch)
+                    else:
+                        for row in batch:
+                            export_file.write(json.dumps(dict(zip(columns, row))) + "\n")
+                    rows += len(batch)
+                    if step_pause:
+                        time.sleep(step_pause)
+
+            exported[table] = (path, rows)
+            print(f"Exported {rows} rows of {table} to {path}")
+    finally:
+        conn.close()
+    return exported
+
+
+class BackupWorker:
+    """
+        Runs backups on a background thread, on request and every backup.interval seconds if set.
+
+        The worker only reads the database, so races keep writing through the writer
+        thread while a backup is copied.
+    """
+
+    def __init__(self, db_path=None, lifecycle=None):
+        self.db_path = db_path or get_settings().database.path
+        self.stop_event = threading.Event()
+        self.requested = threading.Event()
+        self.last_backup = None
+
+        self.thread = threading.Thread(target=self.run, name="database backup")
+        self.thread.daemon = True
+        self.thread.start()
+
+        if lifecycle is not None:
+            lifecycle.register("database backup", stop=self.stop, thread=self.thread)
+
+    def request(self):
+        """ Starts a backup as soon as the one in progress, if any, has finished """
+        self.requested.set()
+
+    def stop(self):
+        self.stop_event.set()
+        self.requested.set()
+
+    def run(self):
+        next_backup = None
+        while not self.stop_event.is_set():
+            interval = get_settings().backup.interval
+            if interval and next_backup is None:
+                next_backup = time.monotonic() + interval
+
+            timeout = None if next_backup is None else max(next_backup - time.monotonic(), 0)
+            self.requested.wait(timeout if timeout is not None else 1.0)
+            due = next_backup is not None and time.monotonic() >= next_backup
+            if self.stop_event.is_set() or not (self.requested.is_set() or due):
+                continue
+
+            self.requested.clear()
+            next_backup = None
+            self.backup()
+
+    def backup(self):
+        backup_settings = get_settings().backup
+        try:
+            self.last_backup = backup_database(self.db_path, backup_settings.directory,
+                                               backup_settings.pages_per_step, backup_settings.step_pause,
+                                               self.stop_event)
+            prune_backups(self.db_path, backup_settings.directory, backup_settings.keep)
+        except BackupCancelled:
+            print("Backup cancelled")
+        except (OSError, sqlite3.Error) as e:
+            print(f"Backup of {self.db_path} failed: {e}")
+
+
+def main():
+    backup_settings = get_settings().backup
+    parser = argparse.ArgumentParser(description="Back up or export the local database while the app is running")
+    parser.add_argument("--db", default=get_settings().database.path)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backup_parser = commands.add_parser("backup", help="copy the database with the online backup API")
+    backup_parser.add_argument("--directory", default=backup_settings.directory)
+    backup_parser.add_argument("--pages-per-step", type=int, default=backup_settings.pages_per_step)
+    backup_parser.add_argument("--step-pause", type=float, default=backup_settings.step_pause)
+
+    export_parser = commands.add_parser("export", help="write results and sessions to compressed files")
+    export_parser.add_argument("--directory", default=backup_settings.directory)
+    export_parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    export_parser.add_argument("--rows-per-step", type=int, default=backup_settings.export_rows_per_step)
+    export_parser.add_argument("--step-pause", type=float, default=backup_settings.step_pause)
+
+    args = parser.parse_args()
+    if not os.path.exists(args.db):
+        print(f"{args.db} not found")
+        sys.exit(1)
+
+    if args.command == "backup":
+        backup_database(args.db, args.directory, args.pages_per_step, args.step_pause)
+        prune_backups(args.db, args.directory, backup_settings.keep)
+    else:
+        export_tables(args.db, args.directory, args.format, args.rows_per_step, args.step_pause)
+
+
+if __name__ == "__main__":
+    main()
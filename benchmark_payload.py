@@ -0,0 +1,84 @@
+import argparse
+import random
+
+import requests
+
+from payload_encoding import encode_plain, encode_results, upload_headers
+from stand_in_server import StandInServer
+
+RACE_TYPES = ["Jet", "Plane", "Co2 Car", "Gravity car", "Walk along glider", "Jet glider"]
+
+
+def synthetic_results(count, players_per_heat=2, heats_per_session=20):
+    """ Results as produced by the app: a few sessions, each with many heats of a few players """
+    results = []
+    heat = 0
+    while len(results) < count:
+        session = heat // heats_per_session
+        race_type = RACE_TYPES[session % len(RACE_TYPES)]
+        race_date = f"2024-05-{1 + session % 28:02d}"
+        for position in range(1, players_per_heat + 1):
+            results.append({
+                "player_id": f"{random.randint(0, 99999):05d}",
+                "position": position,
+                "race_time": round(random.uniform(1.5, 9.0), 3),
+                "reaction_time": round(random.uniform(0.1, 0.6), 3),
+                "lap_time": round(random.uniform(1.5, 9.0), 3),
+                "track_distance": 20.0,
+                "eliminated": 0,
+                "race_type": race_type,
+                "race_date": race_date,
+            })
+        heat += 1
+    return results[:count]
+
+
+def run(count, batch_size):
+    results = synthetic_results(count)
+    server = StandInServer().start()
+    session = requests.Session()
+
+    try:
+        # before: one JSON object per request, as update_player_data/automated_sync_data did
+        for result in results:
+            session.post(server.url, data=encode_plain([result]),
+                         headers={"Content-Type": "application/json"}).raise_for_status()
+        before_bytes, before_requests = server.bytes_received, server.requests_received
+        server.reset_counters()
+
+        # batched only: plain JSON in the same batches as below, what is left is the encoding's own saving
+        for start in range(0, len(results), batch_size):
+            session.post(server.url, data=encode_plain(results[start:start + batch_size]),
+                         headers={"Content-Type": "application/json"}).raise_for_status()
+        batched_bytes, batched_requests = server.bytes_received, server.requests_received
+        assert len(server.results) == len(results), "stand-in lost results"
+        server.reset_counters()
+
+        # after: grouped by session and gzip compressed, batch_size results per request
+        for start in range(0, len(results), batch_size):
+            batch = results[start:start + batch_size]
+            session.post(server.url, data=encode_results(batch), headers=upload_headers()).raise_for_status()
+        after_bytes, after_requests = server.bytes_received, server.requests_received
+
+        assert len(server.results) == len(results), "stand-in lost results"
+    finally:
+        server.stop()
+
+    per_thousand = 1000 / count
+    print(f"Results uploaded: {count}")
+    print(f"Before:       {before_bytes * per_thousand:,.0f} bytes per 1,000 results ({before_requests} requests)")
+    print(f"Batched JSON: {batched_bytes * per_thousand:,.0f} bytes per 1,000 results ({batched_requests} requests, "
+          f"batch size {batch_size})")
+    print(f"After:        {after_bytes * per_thousand:,.0f} bytes per 1,000 results ({after_requests} requests, "
+          f"batch size {batch_size})")
+    print(f"Reduction:    {100 * (1 - after_bytes / before_bytes):.1f}% in total, "
+          f"{100 * (1 - batched_bytes / before_bytes):.1f}% from batching, "
+          f"{100 * (1 - after_bytes / batched_bytes):.1f}% from grouping and gzip on the same batches")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bytes on the wire for result uploads before/after encoding")
+    parser.add_argument("--count", type=int, default=1000, help="number of results to upload")
+    parser.add_argument("--batch-size", type=int, default=200, help="results per encoded upload")
+    args = parser.parse_args()
+    run(args.count, args.batch_size)
@@ -0,0 +1,127 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from local_data import LocalData
+from player_model import PlayerModel
+from remote_backend import StandInBackend
+from remote_data import RemoteData
+from stand_in_server import StandInServer
+from timing import host_now_ns
+
+INSERT_SQL = '''
+    INSERT INTO player_data (player_id, race_date, race_type, position, race_time, reaction_time,
+    lap_time, track_distance, eliminated, synced, host_received_ns)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?)
+'''
+
+# Backlog rows inserted per writer command
+BACKLOG_CHUNK = 10000
+
+
+def backlog_rows(start, count, received_ns):
+    for index in range(start, start + count):
+        yield (f"{index % 100000:05d}", "2024-05-01", "Gravity car", 1 + index % 2, 4.2, 0.31, 4.2, 20.0, 0,
+               received_ns)
+
+
+def live_heats(local_data, rate, stop_event, produced):
+    """ Saves results at rate per second the way a finished heat does, while the backlog drains """
+    interval = 1 / rate
+    next_at = time.perf_counter()
+    while not stop_event.is_set():
+        index = produced[0]
+        local_data.save_locally(PlayerModel(player_number=1 + index % 2, position=1 + index % 2, race_time=4.2,
+                                            reaction_time=0.31, lap_time=4.2, eliminated=0,
+                                            race_type="Gravity car", race_date="2024-05-01",
+                                            player_id=f"{index % 100000:05d}", track_distance=20.0,
+                                            host_received_ns=host_now_ns()))
+        produced[0] += 1
+        next_at += interval
+        stop_event.wait(max(next_at - time.perf_counter(), 0))
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def run(rows, live_rate, latency, jitter, error_rate, rate_limit, timeout):
+    with tempfile.TemporaryDirectory() as directory:
+        local_data = LocalData(os.path.join(directory, "load.db"))
+        server = StandInServer(db_path=os.path.join(directory, "stand_in.db"), latency=latency, jitter=jitter,
+                               error_rate=error_rate, rate_limit=rate_limit).start()
+
+        received_ns = time.time_ns()
+        for start in range(0, rows, BACKLOG_CHUNK):
+            local_data.writer.executemany(INSERT_SQL,
+                                          list(backlog_rows(start, min(BACKLOG_CHUNK, rows - start), received_ns)))
+        print(f"Backlog of {rows} unsynced rows written")
+
+        remote_data = RemoteData(backend=StandInBackend(server.base_url), local_data=local_data, start=False)
+        stop_live = threading.Event()
+        produced = [0]
+        live_thread = None
+        if live_rate > 0:
+            live_thread = threading.Thread(target=live_heats, args=(local_data, live_rate, stop_live, produced))
+            live_thread.start()
+
+        started = time.perf_counter()
+        passes = 0
+        while time.perf_counter() - started < timeout:
+            remote_data.sync_pending()
+            passes += 1
+            if live_thread is not None and not stop_live.is_set() and remote_data.sync_stats.synced >= rows:
+                # as many rows synced as the backlog held, stop the heats and drain what they added
+                stop_live.set()
+                live_thread.join()
+            elif not local_data.fetch_all_data() and (live_thread is None or stop_live.is_set()):
+                break
+        elapsed = time.perf_counter() - started
+
+        stop_live.set()
+        if live_thread is not None:
+            live_thread.join()
+        remaining = len(local_data.fetch_all_data())
+        stored = server.result_count()
+        stats = remote_data.sync_stats
+        lags = sorted(lag / 1e9 for lag in stats.lags_ns)
+
+        server.stop()
+        local_data.close_connection()
+        local_data.writer.stop()
+        local_data.writer.thread.join()
+
+    total = rows + produced[0]
+    print(f"{rows} backlog rows + {produced[0]} live rows through the sync engine in {elapsed:.1f}s, {passes} passes")
+    print(f"Stand-in: latency {latency * 1000:.0f} ms + up to {jitter * 1000:.0f} ms, error rate {error_rate:.0%}, "
+          f"rate limit {rate_limit or 'none'} req/s")
+    print(f"Throughput:  {stats.synced / elapsed:,.0f} rows/s, {stats.batches} batches")
+    print(f"Retries:     {stats.retries} ({server.errors_injected} injected errors, "
+          f"{server.rate_limited} rate limited), {stats.failed_batches} batches given up, "
+          f"{stats.rejected} records refused")
+    print(f"Lag:         p50 {percentile(lags, 0.5):.2f}s, p95 {percentile(lags, 0.95):.2f}s, "
+          f"max {percentile(lags, 1.0):.2f}s from arrival to acknowledged")
+    print(f"Rows:        {stats.synced}/{total} synced, {stored} stored by the stand-in, {remaining} left unsynced")
+    return remaining == 0 and stored >= total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the sync path against the local stand-in backend")
+    parser.add_argument("--rows", type=int, default=100000, help="unsynced rows waiting when the test starts")
+    parser.add_argument("--live-rate", type=float, default=20.0, help="results per second added while draining")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.02, help="fraction of requests answered with 503")
+    parser.add_argument("--rate-limit", type=float, default=None, help="requests per second before 429")
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds before giving up")
+    args = parser.parse_args()
+    ok = run(args.rows, args.live_rate, args.latency, args.jitter, args.error_rate, args.rate_limit, args.timeout)
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
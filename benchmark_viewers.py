@@ -0,0 +1,160 @@
+import argparse
+import asyncio
+import base64
+import json
+import os
+import threading
+import time
+
+from headless import RaceServer
+from race_state import RaceState
+
+# Latency from a state change to every viewer having its patch, as asked for live viewers
+TARGET_MS = 100
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def sent_stamps(players):
+    """ (benchmark_index, benchmark_sent_ns) of every changed player in a patch or state """
+    return [(player["benchmark_index"], player["benchmark_sent_ns"]) for player in (players or {}).values()
+            if isinstance(player, dict) and "benchmark_sent_ns" in player]
+
+
+async def read_frame(reader):
+    """ Reads one unmasked frame sent by the server, :return: (opcode, payload). """
+    header = await reader.readexactly(2)
+    length = header[1] & 0x7F
+    if length == 126:
+        length = int.from_bytes(await reader.readexactly(2), "big")
+    elif length == 127:
+        length = int.from_bytes(await reader.readexactly(8), "big")
+    return header[0] & 0x0F, await reader.readexactly(length)
+
+
+async def viewer(host, port, latencies_ns, resyncs, ready, last_index):
+    reader, writer = await asyncio.open_connection(host, port)
+    key = base64.b64encode(os.urandom(16)).decode()
+    writer.write(f"GET /ws HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                 f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n".encode("latin-1"))
+    await reader.readuntil(b"\r\n\r\n")
+
+    opcode, payload = await read_frame(reader)
+    assert json.loads(payload)["type"] == "snapshot", "viewer did not start with a snapshot"
+    ready()
+
+    latest = -1
+    while latest < last_index:
+        opcode, payload = await read_frame(reader)
+        if opcode != 0x1:
+            continue
+        arrived_ns = time.perf_counter_ns()
+        message = json.loads(payload)
+        if message["type"] == "snapshot":
+            # a viewer that fell behind is resynced, the changes it skipped are not measured
+            resyncs.append(1)
+            stamps = sent_stamps(message["state"]["players"])
+        else:
+            stamps = sent_stamps(message["patch"].get("players"))
+        for index, sent_ns in stamps:
+            latencies_ns.append(arrived_ns - sent_ns)
+            latest = max(latest, index)
+
+    # masked close frame, as clients must send
+    mask = os.urandom(4)
+    writer.write(bytes([0x88, 0x82]) + mask + bytes(byte ^ mask[index % 4] for index, byte in enumerate(b"\x03\xe8")))
+    await writer.drain()
+    writer.close()
+
+
+def produce(race_state, changes, rate, lanes):
+    """ Changes the race state from this thread at rate per second, the way the serial dispatcher does """
+    interval = 1 / rate
+    next_at = time.perf_counter()
+    for index in range(changes):
+        race_state.on_player_info({"player_info": {
+            "player_number": 1 + index % lanes,
+            "position": 1 + index % lanes,
+            "race_time": round(1.5 + index % 700 / 100, 3),
+            "benchmark_index": index,
+            "benchmark_sent_ns": time.perf_counter_ns(),
+        }})
+        next_at += interval
+        time.sleep(max(next_at - time.perf_counter(), 0))
+
+
+def run(viewers, changes, rate, lanes, port):
+    race_state = RaceState(race_type="Gravity car", headline="Get Ready Drivers")
+    server = RaceServer(race_state, None, "127.0.0.1", port)
+
+    server_loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def serve():
+        asyncio.set_event_loop(server_loop)
+        server_loop.run_until_complete(server.start())
+        started.set()
+        server_loop.run_forever()
+        # connections still being handled when the server stopped
+        pending = asyncio.all_tasks(server_loop)
+        for task in pending:
+            task.cancel()
+        server_loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        server_loop.close()
+
+    server_thread = threading.Thread(target=serve, name="race server")
+    server_thread.daemon = True
+    server_thread.start()
+    started.wait()
+
+    async def measure():
+        latencies_ns = []
+        resyncs = []
+        connected = asyncio.Event()
+        count = [0]
+
+        def ready():
+            count[0] += 1
+            if count[0] == viewers:
+                connected.set()
+
+        tasks = [asyncio.create_task(viewer("127.0.0.1", port, latencies_ns, resyncs, ready, changes - 1))
+                 for _ in range(viewers)]
+        await connected.wait()
+        producing = time.perf_counter()
+        await asyncio.to_thread(produce, race_state, changes, rate, lanes)
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=30)
+        return latencies_ns, len(resyncs), time.perf_counter() - producing
+
+    latencies_ns, resyncs, elapsed = asyncio.run(measure())
+    asyncio.run_coroutine_threadsafe(server.stop(), server_loop).result()
+    server_loop.call_soon_threadsafe(server_loop.stop)
+    server_thread.join()
+
+    latencies = sorted(latency / 1e6 for latency in latencies_ns)
+    p95 = percentile(latencies, 0.95)
+    print(f"{viewers} viewers, {changes} changes at {rate:.0f}/s over {lanes} lanes in {elapsed:.1f}s")
+    print(f"Changes received: {len(latencies)}/{viewers * changes}, {resyncs} resyncs of viewers that fell behind")
+    print(f"Latency: p50 {percentile(latencies, 0.5):.1f} ms, p95 {p95:.1f} ms, max {percentile(latencies, 1.0):.1f} ms "
+          f"from the state change to the viewer (target {TARGET_MS} ms)")
+    return len(latencies) == viewers * changes and p95 < TARGET_MS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency of live race state patches to WebSocket viewers")
+    parser.add_argument("--viewers", type=int, default=50)
+    parser.add_argument("--changes", type=int, default=500, help="state changes sent to every viewer")
+    parser.add_argument("--rate", type=float, default=50.0, help="state changes per second")
+    parser.add_argument("--lanes", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+    ok = run(args.viewers, args.changes, args.rate, args.lanes, args.port)
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
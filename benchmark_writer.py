@@ -0,0 +1,108 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from local_data import LocalData
+from persistence_writer import PersistenceWriter
+from player_model import PlayerModel
+
+INSERT_SQL = '''
+    INSERT INTO player_data (player_id, race_date, race_type, position, race_time, reaction_time,
+    lap_time, track_distance, eliminated, synced)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def sample_model(index):
+    return PlayerModel(player_number=1 + index % 2, position=1 + index % 2, race_time=4.2, reaction_time=0.31,
+                       lap_time=4.2, eliminated=0, race_type="Gravity car", race_date="2024-05-01",
+                       player_id=f"{index % 100000:05d}", track_distance=20.0)
+
+
+def connection_per_call(db_path, threads, writes_per_thread):
+    """ The previous pattern: every call opens its own connection, commits and closes it """
+    errors = []
+
+    def worker(offset):
+        for index in range(writes_per_thread):
+            model = sample_model(offset + index)
+            try:
+                conn = sqlite3.connect(db_path, timeout=1)
+                conn.execute(INSERT_SQL, (model.player_id, model.race_date, model.race_type, model.position,
+                                          model.race_time, model.reaction_time, model.lap_time,
+                                          model.track_distance, model.eliminated, 0))
+                conn.commit()
+                conn.close()
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+
+    return run_threads(worker, threads, writes_per_thread), errors
+
+
+def single_writer(db_path, threads, writes_per_thread):
+    local_data = LocalData(db_path)
+    errors = []
+
+    def worker(offset):
+        for index in range(writes_per_thread):
+            try:
+                local_data.save_locally(sample_model(offset + index))
+            except sqlite3.Error as e:
+                errors.append(str(e))
+
+    elapsed = run_threads(worker, threads, writes_per_thread)
+    writer = PersistenceWriter.for_path(db_path)
+    commits = writer.commits
+    writer.stop()
+    writer.thread.join()
+    return elapsed, errors, commits
+
+
+def run_threads(worker, threads, writes_per_thread):
+    workers = [threading.Thread(target=worker, args=(number * writes_per_thread,)) for number in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def count_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    count = conn.execute("SELECT COUNT(*) FROM player_data").fetchone()[0]
+    conn.close()
+    return count
+
+
+def run(threads, writes_per_thread):
+    total = threads * writes_per_thread
+    with tempfile.TemporaryDirectory() as directory:
+        before_path = os.path.join(directory, "before.db")
+        conn = sqlite3.connect(before_path)
+        LocalData.create_tables(conn)
+        conn.commit()
+        conn.close()
+        before_seconds, before_errors = connection_per_call(before_path, threads, writes_per_thread)
+        before_rows = count_rows(before_path)
+
+        after_path = os.path.join(directory, "after.db")
+        after_seconds, after_errors, commits = single_writer(after_path, threads, writes_per_thread)
+        after_rows = count_rows(after_path)
+
+    print(f"{threads} threads x {writes_per_thread} writes")
+    print(f"Connection per call: {before_rows / before_seconds:,.0f} writes/s, "
+          f"{before_rows}/{total} rows, {len(before_errors)} lock errors")
+    print(f"Single writer:       {after_rows / after_seconds:,.0f} writes/s, "
+          f"{after_rows}/{total} rows, {len(after_errors)} errors, {commits} commits")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent write throughput of the local database")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=500, help="writes per thread")
+    args = parser.parse_args()
+    run(args.threads, args.writes)
@@ -0,0 +1,279 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import ipaddress
+import json
+import signal
+
+from backup import BackupWorker
+from lifecycle import LifecycleManager
+from memory_diagnostics import MemoryDiagnostics
+from local_data import LocalData
+from race_state import HeadlessRace, RaceState
+from remote_data import RemoteData
+from serial_communication import SerialCommunication
+from settings import SettingsWatcher, get_settings
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# patches a viewer may fall behind by before it is sent a fresh snapshot instead
+VIEWER_QUEUE_SIZE = 64
+
+
+class Viewer:
+    def __init__(self, writer):
+        self.writer = writer
+        self.queue = asyncio.Queue(maxsize=VIEWER_QUEUE_SIZE)
+        self.resync = False
+
+
+class RaceServer:
+    """
+        Serves the live race state.
+
+        GET /state returns a snapshot, /ws upgrades to a WebSocket that sends a
+        snapshot followed by a merge patch for every change. For local clients
+        only, POST /heat/player_ids saves the finished heat with a JSON list of
+        player IDs and POST /backup starts a database backup. With debug_memory,
+        GET /debug/memory reports the top allocators and DELETE /debug/memory
+        stops tracing, also for local clients only.
+    """
+
+    def __init__(self, race_state, headless_race, host, port, backup_worker=None, debug_memory=False):
+        self.race_state = race_state
+        self.headless_race = headless_race
+        self.backup_worker = backup_worker
+        self.debug_memory = debug_memory
+        self.host = host
+        self.port = port
+        self.viewers = set()
+        self.memory_diagnostics = MemoryDiagnostics()
+        self.loop = None
+        self.server = None
+
+        race_state.add_listener(self.on_state_change)
+
+    def on_state_change(self, version, patch):
+        # called on the serial dispatcher thread
+        if self.loop is not None:
+            message = json.dumps({"type": "patch", "version": version, "patch": patch})
+            self.loop.call_soon_threadsafe(self.broadcast, message)
+
+    def broadcast(self, message):
+        for viewer in self.viewers:
+            if viewer.resync:
+                continue
+            try:
+                viewer.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # a viewer this far behind gets the whole state instead of the backlog
+                viewer.resync = True
+
+    def snapshot_message(self):
+        version, state = self.race_state.snapshot()
+        return json.dumps({"type": "snapshot", "version": version, "state": state})
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        print(f"Serving race state on http://{self.host}:{self.port}/state and ws://{self.host}:{self.port}/ws")
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            for viewer in list(self.viewers):
+                viewer.writer.close()
+            await self.server.wait_closed()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").strip()
+            if not request_line:
+                return
+            method, path, _ = request_line.split(" ", 2)
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            if method == "GET" and path == "/state":
+                await self.send_response(writer, 200, self.snapshot_message())
+            elif method == "GET" and path == "/ws" and headers.get("upgrade", "").lower() == "websocket":
+                await self.handle_websocket(reader, writer, headers)
+            elif path == "/debug/memory" and self.debug_allowed(writer) and method in ("GET", "DELETE"):
+                # tracing slows the whole process, so only the operator on this machine may start it
+                command = self.memory_diagnostics.report if method == "GET" else self.memory_diagnostics.stop
+                report = await asyncio.to_thread(command)
+                await self.send_response(writer, 200, json.dumps({"report": report.splitlines()}))
+            elif method == "POST" and path in ("/heat/player_ids", "/backup") and not self.is_local(writer):
+                # viewers anywhere on the network may watch, only this machine may change results or disk
+                await self.send_response(writer, 403, json.dumps({"error": "forbidden"}))
+            elif method == "POST" and path == "/heat/player_ids":
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                try:
+                    player_ids = json.loads(body or b"[]")
+                    saved = await asyncio.to_thread(self.headless_race.save_pending_heat, player_ids)
+                except ValueError as e:
+                    await self.send_response(writer, 400, json.dumps({"error": str(e)}))
+                else:
+                    await self.send_response(writer, 200, json.dumps({"saved": saved}))
+            elif method == "POST" and path == "/backup" and self.backup_worker is not None:
+                self.backup_worker.request()
+                await self.send_response(writer, 200, json.dumps({"requested": True}))
+            else:
+                await self.send_response(writer, 404, json.dumps({"error": "not found"}))
+        except (ConnectionError, asyncio.IncompleteReadError, KeyError, ValueError) as e:
+            print(f"Viewer connection error: {e}")
+        finally:
+            writer.close()
+
+    def debug_allowed(self, writer):
+        return self.debug_memory and self.is_local(writer)
+
+    @staticmethod
+    def is_local(writer):
+        peer = writer.get_extra_info("peername")
+        return peer is not None and ipaddress.ip_address(peer[0]).is_loopback
+
+    @staticmethod
+    async def send_response(writer, status, body):
+        body = body.encode("utf-8")
+        reason = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found"}.get(status, "")
+        writer.write(f"HTTP/1.1 {status} {reason}\r\n"
+                     f"Content-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\n"
+                     f"Access-Control-Allow-Origin: *\r\n"
+                     f"Connection: close\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+
+    async def handle_websocket(self, reader, writer, headers):
+        accept = base64.b64encode(hashlib.sha1((headers["sec-websocket-key"] + WEBSOCKET_GUID).encode()).digest())
+        writer.write(b"HTTP/1.1 101 Switching Protocols\r\n"
+                     b"Upgrade: websocket\r\n"
+                     b"Connection: Upgrade\r\n"
+                     b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+
+        viewer = Viewer(writer)
+        self.viewers.add(viewer)
+        closed = asyncio.create_task(self.read_until_close(reader, writer))
+        try:
+            await self.send_frame(writer, self.snapshot_message())
+            while not closed.done():
+                get = asyncio.create_task(viewer.queue.get())
+                done, _ = await asyncio.wait({get, closed}, return_when=asyncio.FIRST_COMPLETED)
+                if get not in done:
+                    get.cancel()
+                    break
+                if viewer.resync:
+                    viewer.queue = asyncio.Queue(maxsize=VIEWER_QUEUE_SIZE)
+                    viewer.resync = False
+                    await self.send_frame(writer, self.snapshot_message())
+                else:
+                    await self.send_frame(writer, get.result())
+        finally:
+            self.viewers.discard(viewer)
+            if closed.done() and not closed.cancelled():
+                # a viewer dropping the connection without a close frame is not an error
+                closed.exception()
+            closed.cancel()
+
+    @staticmethod
+    async def send_frame(writer, text, opcode=0x1):
+        payload = text.encode("utf-8") if isinstance(text, str) else text
+        length = len(payload)
+        if length < 126:
+            header = bytes([0x80 | opcode, length])
+        elif length < 65536:
+            header = bytes([0x80 | opcode, 126]) + length.to_bytes(2, "big")
+        else:
+            header = bytes([0x80 | opcode, 127]) + length.to_bytes(8, "big")
+        writer.write(header + payload)
+        await writer.drain()
+
+    async def read_until_close(self, reader, writer):
+        """ Viewers only receive, their frames are read to answer pings and notice closes """
+        while True:
+            header = await reader.readexactly(2)
+            opcode = header[0] & 0x0F
+            length = header[1] & 0x7F
+            if length == 126:
+                length = int.from_bytes(await reader.readexactly(2), "big")
+            elif length == 127:
+                length = int.from_bytes(await reader.readexactly(8), "big")
+            mask = await reader.readexactly(4) if header[1] & 0x80 else None
+            payload = await reader.readexactly(length)
+            if mask is not None:
+                payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+
+            if opcode == 0x8:
+                await self.send_frame(writer, payload[:2], opcode=0x8)
+                return
+            if opcode == 0x9:
+                await self.send_frame(writer, payload, opcode=0xA)
+
+
+async def serve(args):
+    lifecycle = LifecycleManager()
+    LocalData.register_writer(lifecycle)
+    SettingsWatcher(lifecycle=lifecycle)
+    backup_worker = BackupWorker(lifecycle=lifecycle)
+    race_state = RaceState(race_type=args.race_type, headline=args.headline)
+    remote_data = RemoteData(lifecycle=lifecycle)
+    headless_race = HeadlessRace(race_state, remote_data, args.race_type, args.track_distance, lifecycle=lifecycle)
+
+    server = RaceServer(race_state, headless_race, args.host, args.port, backup_worker,
+                        debug_memory=args.debug_memory)
+    await server.start()
+
+    SerialCommunication(args.com_port, args.baud_rate,
+                        headless_race.display,
+                        lambda message, is_success: print(message),
+                        headless_race.status_update,
+                        lambda: None,
+                        lifecycle=lifecycle,
+                        connection_status_callback=race_state.on_connection)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows event loops have no signal handlers, Ctrl+C raises KeyboardInterrupt instead
+            pass
+
+    try:
+        await stop.wait()
+    finally:
+        await server.stop()
+        # the heat saver saves the heat still waiting for player IDs once the serial threads are done
+        await asyncio.to_thread(lifecycle.shutdown, get_settings().ui.shutdown_deadline)
+
+
+def main():
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Run the race track without the GUI and serve live race state")
+    parser.add_argument("--com-port", default=settings.serial.port,
+                        help="serial port, found automatically when omitted")
+    parser.add_argument("--baud-rate", type=int, default=settings.serial.baud_rate)
+    parser.add_argument("--race-type", default=settings.ui.race_type)
+    parser.add_argument("--headline", default=settings.ui.ready_headline)
+    parser.add_argument("--track-distance", default=None)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--debug-memory", action="store_true",
+                        help="serve /debug/memory to clients on this machine")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import math
+from functools import lru_cache
+from typing import NamedTuple
+
+# Lane colors in lane order, extra lanes reuse the palette
+LANE_COLORS = ['red', 'green', 'blue', 'yellow', 'orange', 'purple', 'cyan', 'magenta',
+               'brown', 'pink', 'olive', 'navy']
+
+# Most lanes shown side by side before wrapping onto another row
+MAX_COLUMNS = 4
+
+# Base font sizes (headline, value, label) by lanes per row, tuned on a 400 pixel wide lane
+BASE_FONT_SIZES = {
+    1: (65, 40, 18),
+    2: (65, 40, 18),
+    3: (85, 65, 43),
+    4: (95, 75, 53),
+}
+REFERENCE_WIDTH = 400
+
+# Approximate line height in pixels per point, and the space taken by the color
+# bar and paddings of a lane, used to keep the lane text inside its row
+LINE_HEIGHT_PER_POINT = 1.35
+LANE_CHROME_HEIGHT = 90
+
+# Window sizes are rounded to this many pixels before the lookup, so dragging a
+# window edge reuses layouts instead of computing one per pixel
+SIZE_STEP = 20
+
+
+class LaneLayout(NamedTuple):
+    columns: int
+    rows: int
+    cell_width: int
+    cell_height: int
+    font_size: int
+    font_size_small: int
+    font_size_label: int
+    padx: int
+    pady: int
+
+
+def lane_color(player_number):
+    if player_number is None or player_number < 1:
+        return 'gray'
+    return LANE_COLORS[(player_number - 1) % len(LANE_COLORS)]
+
+
+def grid_position(index, layout):
+    """ Row and column of the lane at the given zero based index """
+    return divmod(index, layout.columns)
+
+
+@lru_cache(maxsize=128)
+def compute_layout(lanes, width, height):
+    """
+        Computes grid geometry, paddings and font sizes for the lane widgets.
+
+        :param lanes: Number of lanes on screen.
+        :param width: Width available for the lanes in pixels.
+        :param height: Height available for the lanes in pixels.
+        :return: LaneLayout for the given size.
+    """
+    lanes = max(1, lanes)
+    columns = min(lanes, MAX_COLUMNS)
+    rows = math.ceil(lanes / columns)
+
+    padx = 10 if columns <= MAX_COLUMNS // 2 else 6
+    pady = 20 if rows == 1 else 8
+
+    cell_width = max(1, width // columns - 2 * padx)
+    cell_height = max(1, height // rows - 2 * pady)
+
+    base_size, base_size_small, base_size_label = BASE_FONT_SIZES[columns]
+    # a lane shows one headline line, three value lines and two label lines
+    text_height = LINE_HEIGHT_PER_POINT * (base_size + 3 * base_size_small + 2 * base_size_label)
+    scale = min(cell_width / REFERENCE_WIDTH, max(0, cell_height - LANE_CHROME_HEIGHT) / text_height)
+
+    return LaneLayout(
+        columns=columns,
+        rows=rows,
+        cell_width=cell_width,
+        cell_height=cell_height,
+        font_size=max(10, int(base_size * scale)),
+        font_size_small=max(8, int(base_size_small * scale)),
+        font_size_label=max(6, int(base_size_label * scale)),
+        padx=padx,
+        pady=pady,
+    )
+
+
+def layout_for(lanes, width, height):
+    """ Cached layout lookup with the window size rounded to SIZE_STEP """
+    return compute_layout(lanes, max(SIZE_STEP, round(width / SIZE_STEP) * SIZE_STEP),
+                          max(SIZE_STEP, round(height / SIZE_STEP) * SIZE_STEP))
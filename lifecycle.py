@@ -0,0 +1,109 @@
+import threading
+import time
+
+
+class LifecycleManager:
+    """
+        Coordinates shutdown of the background components.
+
+        Components are stopped in the reverse order they were registered, so the
+        serial reader (registered on connect) stops feeding data before the sync
+        loop and persistence layers they write into are closed.
+    """
+
+    def __init__(self):
+        self.stop_event = threading.Event()
+        self.components = []
+        self.lock = threading.Lock()
+        self.last_report = None
+
+    def register(self, name, stop=None, thread=None, close=None, signal_first=True):
+        """
+            Registers a component to be shut down.
+
+            :param name: Name shown in the shutdown report.
+            :param stop: Callable signalling the component to stop, must not block.
+            :param thread: Thread to join once the component has been signalled.
+            :param close: Callable releasing resources (ports, connections) after the thread finished.
+            :param signal_first: Signal the component together with the others at the start of the shutdown.
+                                 Components that others write into pass False and are only signalled once
+                                 the components registered after them have finished.
+        """
+        with self.lock:
+            self.components.append({"name": name, "stop": stop, "thread": thread, "close": close,
+                                    "signal_first": signal_first})
+
+    def unregister(self, name):
+        with self.lock:
+            self.components = [component for component in self.components if component["name"] != name]
+
+    @property
+    def stopping(self):
+        return self.stop_event.is_set()
+
+    def shutdown(self, deadline=5.0):
+        """
+            Stops every registered component within the deadline.
+
+            :param deadline: Seconds allowed for the whole shutdown.
+            :return: Report with the time each component took and whether it stopped cleanly.
+        """
+        started = time.perf_counter()
+        end = started + deadline
+        self.stop_event.set()
+
+        with self.lock:
+            components = list(reversed(self.components))
+            self.components = []
+
+        # signal everything first so the components wind down in parallel
+        for component in components:
+            if component["signal_first"]:
+                self.signal(component)
+
+        report = []
+        for component in components:
+            component_started = time.perf_counter()
+            clean = True
+
+            if not component["signal_first"]:
+                self.signal(component)
+
+            thread = component["thread"]
+            if thread is not None and thread is not threading.current_thread():
+                thread.join(max(0.0, end - time.perf_counter()))
+                clean = not thread.is_alive()
+
+            if component["close"] is not None:
+                try:
+                    component["close"]()
+                except Exception as e:
+                    print(f"Error closing {component['name']}: {e}")
+                    clean = False
+
+            report.append({
+                "name": component["name"],
+                "seconds": time.perf_counter() - component_started,
+                "clean": clean,
+            })
+
+        total = time.perf_counter() - started
+        self.last_report = {"seconds": total, "components": report}
+        self.print_report()
+        return self.last_report
+
+    @staticmethod
+    def signal(component):
+        if component["stop"] is not None:
+            try:
+                component["stop"]()
+            except Exception as e:
+                print(f"Error stopping {component['name']}: {e}")
+
+    def print_report(self):
+        if self.last_report is None:
+            return
+        print(f"Shutdown finished in {self.last_report['seconds'] * 1000:.1f} ms")
+        for component in self.last_report["components"]:
+            state = "stopped" if component["clean"] else "did not stop before the deadline"
+            print(f"  {component['name']}: {component['seconds'] * 1000:.1f} ms, {state}")
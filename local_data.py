@@ -2,29 +2,57 @@
 import sqlite3
 from threading import local
 from player_model import PlayerModel
+from persistence_writer import PersistenceWriter
+from settings import add_listener, get_settings
+from timing import to_wall_clock_ns
+
+# Columns added after the first release, created on databases that predate them
+ADDED_PLAYER_DATA_COLUMNS = {
+    "host_received_ns": "INTEGER",
+    "race_time_corrected": "REAL",
+    "reaction_time_corrected": "REAL",
+    "lap_time_corrected": "REAL",
+}
 
 
 class LocalData:
+    # read-only connections, one per thread and database file
     _thread_local = local()
 
-    def __init__(self):
-        # Initializing the database and creating the table with a single connection
+    def __init__(self, db_path=None):
+        self.db_path = db_path or get_settings().database.path
+
+        # every write goes through the single writer thread of this database file
+        self.writer = PersistenceWriter.for_path(self.db_path)
+
+        # Initializing the database and creating the tables on the writer connection
         self.create_local_table()
 
     @staticmethod
-    def get_connection():
-        if not hasattr(LocalData._thread_local, "connection"):
-            LocalData._thread_local.connection = sqlite3.connect('local_data.db')
-        return LocalData._thread_local.connection
+    def register_writer(lifecycle, db_path=None):
+        """ Registers the writer so it is stopped after everything writing into it, draining its queue """
+        writer = PersistenceWriter.for_path(db_path or get_settings().database.path)
+        lifecycle.register("persistence writer", stop=writer.stop, thread=writer.thread, signal_first=False)
 
-    @staticmethod
-    def close_connection():
-        if hasattr(LocalData._thread_local, "connection"):
-            LocalData._thread_local.connection.close()
-            del LocalData._thread_local.connection
+        # pragmas are tuned through config.json while the app runs
+        add_listener(writer.reconfigure)
+
+    def get_connection(self):
+        connections = LocalData._thread_local.__dict__.setdefault("connections", {})
+        if self.db_path not in connections:
+            connections[self.db_path] = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        return connections[self.db_path]
+
+    def close_connection(self):
+        connections = LocalData._thread_local.__dict__.get("connections", {})
+        if self.db_path in connections:
+            connections.pop(self.db_path).close()
 
     def create_local_table(self):
-        conn = self.get_connection()
+        self.writer.call(self.create_tables)
+
+    @staticmethod
+    def create_tables(conn):
         cursor = conn.cursor()
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS player_data (
@@ -41,6 +69,12 @@ class LocalData:
                 synced INTEGER DEFAULT 0)
         ''')
 
+        # appended after synced so positional reads of existing rows keep working
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(player_data)")}
+        for column, column_type in ADDED_PLAYER_DATA_COLUMNS.items():
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE player_data ADD COLUMN {column} {column_type}")
+
         # Table for storing race session information
         cursor.execute('''
                 CREATE TABLE IF NOT EXISTS race_session_info (
@@ -54,64 +88,51 @@ class LocalData:
                     inserted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)
             ''')
 
-        conn.commit()
-        self.close_connection()
-
     def save_locally(self, player_model: PlayerModel):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO player_data (player_id, race_date, race_type, position, race_time, reaction_time, 
-            lap_time, track_distance, eliminated, synced)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (player_model.player_id, player_model.race_date, player_model.race_type,
-              player_model.position, player_model.race_time, player_model.reaction_time,
-              player_model.lap_time, player_model.track_distance, player_model.eliminated, 0))
-        conn.commit()
-        self.close_connection()
+        self.insert_player_data(player_model, synced=0)
 
     def save_locally_synced(self, player_model: PlayerModel):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-                INSERT INTO player_data (player_id, race_date, race_type, position, 
-                race_time, reaction_time, lap_time, track_distance, eliminated, synced)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (player_model.player_id, player_model.race_date, player_model.race_type,
-                  player_model.position, player_model.race_time, player_model.reaction_time,
-                  player_model.lap_time, player_model.track_distance, player_model.eliminated, 1))
-        conn.commit()
-        self.close_connection()
+        self.insert_player_data(player_model, synced=1)
+
+    def insert_player_data(self, player_model: PlayerModel, synced):
+        self.writer.execute('''
+            INSERT INTO player_data (player_id, race_date, race_type, position, race_time, reaction_time,
+            lap_time, track_distance, eliminated, synced, host_received_ns, race_time_corrected,
+            reaction_time_corrected, lap_time_corrected)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (player_model.player_id, player_model.race_date, player_model.race_type,
+              player_model.position, player_model.race_time, player_model.reaction_time,
+              player_model.lap_time, player_model.track_distance, player_model.eliminated, synced,
+              to_wall_clock_ns(player_model.host_received_ns), player_model.race_time_corrected,
+              player_model.reaction_time_corrected, player_model.lap_time_corrected))
 
     def fetch_all_data(self):
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM player_data WHERE synced = 0")
         un_synced_records = cursor.fetchall()
-        self.close_connection()
         return un_synced_records
 
-    def delete_record(self, record_id):
+    def fetch_last_race_session_info(self):
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute("DELETE FROM player_data WHERE id = ?", (record_id,))
-        conn.commit()
-        self.close_connection()
+        cursor.execute("SELECT race_type, headline, track_distance, country, city, com_port "
+                       "FROM race_session_info ORDER BY id DESC LIMIT 1")
+        return cursor.fetchone()
+
+    def delete_record(self, record_id):
+        self.writer.execute("DELETE FROM player_data WHERE id = ?", (record_id,))
 
     def synced_record(self, player_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE player_data SET synced = 1 WHERE id = ?", (player_id,))
-        conn.commit()
-        self.close_connection()
+        self.writer.execute("UPDATE player_data SET synced = 1 WHERE id = ?", (player_id,))
+
+    def synced_records(self, record_ids):
+        self.writer.executemany("UPDATE player_data SET synced = 1 WHERE id = ?",
+                                [(record_id,) for record_id in record_ids])
 
     def save_race_session_info(self, race_type,headline, track_distance, country, city, com_port):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-                INSERT INTO race_session_info (race_type, headline, track_distance, country, city, 
+        self.writer.execute('''
+                INSERT INTO race_session_info (race_type, headline, track_distance, country, city,
                 com_port)
                 VALUES (?, ?, ?, ?, ?, ?)
             ''', (race_type, headline, track_distance, country,city,com_port))
-        conn.commit()
-        self.close_connection()
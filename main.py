@@ -1,78 +1,61 @@
-import time
-from datetime import datetime
-import serial.tools.list_ports
-import serial
-import json
-import threading
+import queue
 import tkinter
 from tkinter import messagebox, font, simpledialog
 import customtkinter as ctk
 
 from remote_data import RemoteData
-from player_model import PlayerModel
+from race_state import HeatResults
 from local_data import LocalData
-
-
-class SerialCommunication:
-    def __init__(self, port, baud_rate, update_callback, messagebox_callback,
-                 status_update_label_callback, comport_connected_label_callback):
-        self.port = port
-        self.baud_rate = baud_rate
-        self.update_callback = update_callback
-        self.status_update_label_callback = status_update_label_callback
-        self.comport_connected_label_callback = comport_connected_label_callback
-        self.messagebox_callback = messagebox_callback
-        self.serial = None
-
-        self.ports = serial.tools.list_ports.comports()
-        self.port_list = [str(port) for port in self.ports]
-        for comport in self.port_list:
-            print(comport)
-
-        # if ports are available then connecting to the given (COM) port
-        if self.port is not None:
-            try:
-                # Serial port initialization
-                self.serial = serial.Serial(self.port, self.baud_rate)
-                print(f"Connected to {self.port}")
-
-                # callbacks
-                self.comport_connected_label_callback()
-                self.messagebox_callback(f'Connected to {self.serial.port}', True)
-
-                # starting thread to fetch data from arduino
-                self.read_thread = threading.Thread(target=self.read_serial_data)
-                self.read_thread.daemon = True
-                self.read_thread.start()
-
-            except serial.SerialException as e:
-                print(f"Exception: {e}")
-                messagebox_callback(e, False)
-
-    def read_serial_data(self):
-        while True:
-            if self.serial.in_waiting:
-                data = self.serial.readline().decode().strip()
+from player_registry import PLAYER_ID_LENGTH
+from layout_engine import lane_color, layout_for, grid_position
+from lifecycle import LifecycleManager
+from serial_communication import SerialCommunication
+from memory_diagnostics import MemoryDiagnostics
+from backup import BackupWorker
+from animation import AnimationTimeline, FontCache
+from timing import host_now_ns
+from settings import SettingsWatcher, add_listener, get_settings
+
+# font sizes of the main label, in points
+HEADLINE_FONT_SIZE = 120
+BANNER_FONT_SIZE = 100
+COUNTDOWN_FONT_SIZE = 500
+
+
+class UiCalls:
+    """
+        Runs callbacks of background threads on the Tk thread.
+
+        A Tk call from another thread waits for the Tk thread to run it, which never
+        happens while the Tk thread waits for that thread (closing the window joins
+        the serial dispatcher). Callbacks are queued instead and the Tk thread
+        drains the queue once per animation frame.
+    """
+
+    def __init__(self, widget, frame_rate=60):
+        self.widget = widget
+        self.interval_ms = max(int(1000 / frame_rate), 1)
+        self.calls = queue.SimpleQueue()
+        widget.after(self.interval_ms, self.poll)
+
+    def wrap(self, callback):
+        """ :return: Function queueing callback with its arguments, may be called from any thread. """
+        return lambda *args: self.calls.put((callback, args))
+
+    def poll(self):
+        try:
+            while True:
                 try:
-                    received_data = json.loads(data)  # Assuming data is in JSON format
-                    if isinstance(received_data, dict):
-
-                        # To display players data
-                        if "player_info" in received_data:
-                            self.update_callback(received_data)
-
-                        # updating the label based on the game
-                        if "status" in received_data:
-                            self.status_update_label_callback(received_data)
-
-                    else:
-                        pass
-
-                except json.JSONDecodeError as e:
-                    print("JSON decode error:", e)
-                    print(data)
+                    callback, args = self.calls.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    callback(*args)
                 except Exception as e:
-                    print("Error:", e)
+                    print(f"Error in UI callback: {e}")
+        finally:
+            # armed after the calls ran, a dialog waiting for input holds back the frames after it
+            self.widget.after(self.interval_ms, self.poll)
 
 
 class App(ctk.CTk):
@@ -95,11 +78,33 @@ class App(ctk.CTk):
         self.bind("<F11>", self.toggle_full_screen)
         self.bind("<Escape>", self.end_full_screen)
 
+        # F9 prints the top memory allocators, the first press starts tracing, Shift+F9 stops it
+        self.memory_diagnostics = MemoryDiagnostics()
+        self.bind("<F9>", self.show_memory_report)
+        self.bind("<Shift-F9>", self.stop_memory_tracing)
+
+        # F10 backs up the database in the background, races keep writing meanwhile
+        self.bind("<F10>", self.request_backup)
+
+        # stops background threads and closes the port and database when the window closes
+        self.lifecycle = LifecycleManager()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # settings from config.json, loaded once and reloaded when the file changes
+        settings = get_settings()
+        App.race_type = settings.ui.race_type
+        App.ready_headline = settings.ui.ready_headline
+
+        # registered first so it is closed last, after the threads writing into it
+        LocalData.register_writer(self.lifecycle)
+        SettingsWatcher(lifecycle=self.lifecycle)
+        self.backup_worker = BackupWorker(lifecycle=self.lifecycle)
+
         # side_bar instance with None for maine_frame
-        self.side_bar = SideBar(self, main_frame=None)
+        self.side_bar = SideBar(self, main_frame=None, lifecycle=self.lifecycle)
 
         # passing side_bar instance into main_frame
-        self.main_frame = MainFrame(self, self.side_bar)
+        self.main_frame = MainFrame(self, self.side_bar, lifecycle=self.lifecycle)
 
         # updating reference of main frame into side_bar
         # and configuring the reset button command after main frame is initialized
@@ -109,6 +114,25 @@ class App(ctk.CTk):
         # run
         self.mainloop()
 
+    def on_close(self):
+        # seconds the window close waits for background threads to finish their writes
+        self.lifecycle.shutdown(deadline=get_settings().ui.shutdown_deadline)
+        self.destroy()
+
+    def show_memory_report(self, event=None):
+        report = self.memory_diagnostics.report()
+        print(report)
+        messagebox.showinfo("Memory", report)
+
+    def stop_memory_tracing(self, event=None):
+        message = self.memory_diagnostics.stop()
+        print(message)
+        messagebox.showinfo("Memory", message)
+
+    def request_backup(self, event=None):
+        self.backup_worker.request()
+        print("Database backup requested")
+
     def maximize_window(self):
         self.state("zoomed")
 
@@ -122,9 +146,11 @@ class App(ctk.CTk):
 
 
 class SideBar(ctk.CTkFrame):
-    def __init__(self, parent, main_frame):
+    def __init__(self, parent, main_frame, lifecycle=None):
         super().__init__(parent)
 
+        self.lifecycle = lifecycle
+
         # instance of Main frame to access the class methods
         self.is_success = None
         self.message = None
@@ -142,14 +168,18 @@ class SideBar(ctk.CTkFrame):
         self.configure(fg_color='gray70')
         self.place(x=0, y=0, relwidth=0.12, relheight=1)
 
+        ui_settings = get_settings().ui
+
+        # serial and settings callbacks are handed to the Tk thread through this queue
+        self.ui_calls = UiCalls(self, frame_rate=ui_settings.frame_rate)
+
         # Race type dropdown
-        self.race_types = ["Jet", "Plane", "Co2 Car",
-                           "Gravity car","Walk along glider", "Jet glider"]  # predefined race types
+        self.race_types = ui_settings.race_types  # predefined race types
         self.race_type_dropdown = ctk.CTkOptionMenu(self, values=self.race_types)
         self.race_type_dropdown.pack(padx=5, pady=5)
 
         # headline Dropdown
-        self.headline_list = ["Get Ready Pilots", "Get Ready Drivers"]
+        self.headline_list = ui_settings.headlines
         self.headline_dropdown = ctk.CTkOptionMenu(self, values=self.headline_list)
         self.headline_dropdown.pack(padx=5, pady=5)
 
@@ -163,9 +193,12 @@ class SideBar(ctk.CTkFrame):
         self.city_entry.pack(padx=5, pady=5)
 
         # taking input of (COM) port number
-        self.com_port_entry = ctk.CTkEntry(self, placeholder_text="Enter (COM) Number")
+        self.com_port_entry = ctk.CTkEntry(self, placeholder_text="(COM) Number or blank")
         self.com_port_entry.pack(padx=5, pady=5)
 
+        self.fill_defaults(ui_settings)
+        add_listener(self.on_ui_thread(self.apply_settings))
+
         # connect button and reset button
         self.connect_button = ctk.CTkButton(self, text='Connect', command=self.connect_serial)
         self.connect_button.pack(side='top', padx=5, pady=5)
@@ -176,6 +209,11 @@ class SideBar(ctk.CTkFrame):
         # serial connection indicator RED for disconnect, BLUE for connected
         self.circle = Circle(self, radius=25, color="red")
 
+        # last connection event, including how long a reconnect took
+        self.connection_status_label = ctk.CTkLabel(self, text="", wraplength=140,
+                                                    font=ctk.CTkFont(size=11, family='Helvetica'))
+        self.connection_status_label.pack(side='bottom', padx=5)
+
         # Divider
         self.divider_frame = ctk.CTkFrame(self, height=2, fg_color="gray80")
         self.divider_frame.pack(fill='x', pady=10, padx=4)
@@ -209,8 +247,7 @@ class SideBar(ctk.CTkFrame):
             self.headline_dropdown.get().strip(),
             self.track_distance_entry.get().strip(),
             self.country_entry.get().strip(),
-            self.city_entry.get().strip(),
-            self.com_port_entry.get().strip()
+            self.city_entry.get().strip()
         ]):
             messagebox.showwarning("Incomplete Information", "Please fill in all the fields"
                                                              " before connecting")
@@ -221,24 +258,68 @@ class SideBar(ctk.CTkFrame):
                                                track_distance=self.track_distance_entry.get().strip(),
                                                country=self.country_entry.get().strip(),
                                                city=self.city_entry.get().strip(),
-                                               com_port=self.com_port_entry.get().strip())
+                                               com_port=self.com_port_entry.get().strip() or "auto")
 
         # passing data to main frame
         self.main_frame.race_type = self.race_type_dropdown.get().strip()
         self.main_frame.race_headline = self.headline_dropdown.get().strip()
         self.main_frame.track_distance = self.track_distance_entry.get().strip()
 
-        # Geather and display COM port information
-        com_port = "COM" + self.com_port_entry.get()
+        # Geather and display COM port information, a blank entry searches for the Arduino
+        com_number = self.com_port_entry.get().strip()
+        com_port = "COM" + com_number if com_number else get_settings().serial.port
         self.com_port_entry.delete(0, 'end')
-        print(f"Connecting to {com_port} with provided race details...")
-
-        # initializing serial communication
-        self.serial_communication = SerialCommunication(com_port, 9600,
-                                                        self.main_frame.display,
-                                                        self.update_message_box,
-                                                        self.main_frame.status_update_label,
-                                                        self.main_frame.com_port_connected_label)
+        print(f"Connecting to {com_port or 'first Arduino found'} with provided race details...")
+        self.connect_button.configure(state='disabled')
+        self.circle.label.configure(text="Searching...")
+
+        # initializing serial communication, it connects on its own thread
+        self.serial_communication = SerialCommunication(com_port, get_settings().serial.baud_rate,
+                                                        self.on_ui_thread(self.main_frame.display),
+                                                        self.on_ui_thread(self.update_message_box),
+                                                        self.on_ui_thread(self.main_frame.status_update_label),
+                                                        self.on_ui_thread(self.main_frame.com_port_connected_label),
+                                                        lifecycle=self.lifecycle,
+                                                        connection_status_callback=self.on_ui_thread(
+                                                            self.update_connection_status))
+
+    def fill_defaults(self, ui_settings):
+        """ Select the configured race type and headline, and prefill the last session's details """
+        if ui_settings.race_type in self.race_types:
+            self.race_type_dropdown.set(ui_settings.race_type)
+        if ui_settings.ready_headline in self.headline_list:
+            self.headline_dropdown.set(ui_settings.ready_headline)
+
+        last_session = self.local_data.fetch_last_race_session_info() if ui_settings.remember_session else None
+        if last_session is not None:
+            race_type, headline, track_distance, country, city, com_port = last_session
+            if race_type in self.race_types:
+                self.race_type_dropdown.set(race_type)
+            if headline in self.headline_list:
+                self.headline_dropdown.set(headline)
+            for entry, value in ((self.track_distance_entry, track_distance), (self.country_entry, country),
+                                 (self.city_entry, city)):
+                if value not in (None, ""):
+                    entry.insert(0, str(value))
+
+    def apply_settings(self, settings):
+        # dropdown choices follow config.json, keeping the current selection when it still exists
+        self.race_types = settings.ui.race_types
+        self.headline_list = settings.ui.headlines
+        self.race_type_dropdown.configure(values=self.race_types)
+        self.headline_dropdown.configure(values=self.headline_list)
+        if self.race_type_dropdown.get() not in self.race_types and self.race_types:
+            self.race_type_dropdown.set(self.race_types[0])
+        if self.headline_dropdown.get() not in self.headline_list and self.headline_list:
+            self.headline_dropdown.set(self.headline_list[0])
+
+    def on_ui_thread(self, callback):
+        # serial callbacks arrive on the reader and dispatcher threads, hand them to the Tk event loop
+        return self.ui_calls.wrap(callback)
+
+    def update_connection_status(self, connected, message):
+        self.circle.update_connection_status(connected)
+        self.connection_status_label.configure(text=message)
 
     def update_message_box(self, message, is_success):
         self.message = message
@@ -255,6 +336,8 @@ class SideBar(ctk.CTkFrame):
             self.reset_button.configure(state='normal')
         else:
             messagebox.showerror("Failed", message)
+            self.connect_button.configure(state='normal')
+            self.circle.update_connection_status(False)
 
     def ir_sensor_status(self, data):
         self.sensor_data = data
@@ -280,11 +363,9 @@ class SideBar(ctk.CTkFrame):
 
 
 class MainFrame(ctk.CTkFrame):
-    playerWidget = []
-    playersDataList = []
     dynamic_label = None
 
-    def __init__(self, parent, sidebar):
+    def __init__(self, parent, sidebar, lifecycle=None):
         super().__init__(parent)
 
         # store reference to sidebar
@@ -292,9 +373,17 @@ class MainFrame(ctk.CTkFrame):
 
         self.place(relx=0.12, y=0, relwidth=0.88, relheight=1)
 
+        # fonts of the headline, banners and countdown, built once instead of on every status
+        self.fonts = FontCache(lambda size, weight: ctk.CTkFont(size=size, weight=weight, family='Helvetica'))
+        self.fonts.preload((HEADLINE_FONT_SIZE, BANNER_FONT_SIZE, COUNTDOWN_FONT_SIZE), weight=font.BOLD)
+
+        # countdown and banners are keyframes on the monotonic clock the serial frames are stamped with
+        self.timeline = AnimationTimeline(self, frame_rate=get_settings().ui.frame_rate)
+
         self.label = ctk.CTkLabel(self, text='Enter Race Details',
-                                  font=ctk.CTkFont(size=120, weight=font.BOLD, family='Helvetica'))
+                                  font=self.fonts.get(HEADLINE_FONT_SIZE, font.BOLD))
         self.label.pack(expand=True, fill='both')
+        self.label_expanded = True
 
         # list for store race details
         self.race_type = None
@@ -305,10 +394,20 @@ class MainFrame(ctk.CTkFrame):
         self.local_data = LocalData()
 
         # Initializing remote data instance
-        self.remote_data = RemoteData()
+        self.remote_data = RemoteData(lifecycle=lifecycle)
+
+        # player widgets of the current heat, per instance so nothing outlives a reset
+        self.playerWidget = []
 
-        # Initializing model list for final data
-        self.player_model_list = []
+        # results of the current heat, kept and saved outside Tk (see race_state.HeatResults)
+        self.heat_results = HeatResults(self.remote_data, lifecycle=lifecycle)
+
+        # container the player lanes are laid out in, shown once the first player arrives
+        self.lanes_frame = ctk.CTkFrame(self, fg_color='transparent')
+        self.lanes_layout = None
+        # grid rows and columns configured so far, a heat with fewer lanes resets the rest
+        self.lanes_grid_size = 0
+        self.lanes_frame.bind("<Configure>", self.on_lanes_resize)
 
     def com_port_connected_label(self):
         self.label.configure(text=self.race_headline)
@@ -322,69 +421,118 @@ class MainFrame(ctk.CTkFrame):
 
         if isinstance(data, dict) and all(key in data for key in ("status",)):
             if status == "Start":
-                for i in range(3, 0, -1):
-                    self.label.configure(text=i, font=ctk.CTkFont(size=500, weight=font.BOLD, family='Helvetica'))
-                    time.sleep(1)
-                self.label.configure(text="Go")
+                self.start_countdown(data)
             elif status == "Reset":
                 print(f"status: {status}")
                 self.destroy_widget()
             elif status == "Race finished":
-                # date of race
-                # Date of race as a string
-                date_stamp = datetime.now()
-                cd = date_stamp.date().strftime('%Y-%m-%d')  # Format date as string "YYYY-MM-DD"
-                print(f"Date: {cd}")
+                players = self.heat_results.finish(self.race_type, self.track_distance)
 
-                dialog = PlayerIDDialog(self, playersDataList=self.playersDataList)
+                dialog = PlayerIDDialog(self, playersDataList=players,
+                                        player_lookup=self.remote_data.player_registry.snapshot())
                 player_ids = dialog.get_player_ids()
                 print(player_ids)
 
-                for index, child in enumerate(self.playersDataList):
-                    # converting dict into player model and passing it to database
-                    player_dict = child
-                    # player_id_dialog = PlayerIDDialog(self, child["player_number"])
-                    player_id = player_ids[index]
-
-                    player_model = PlayerModel(**player_dict, race_type=self.race_type,
-                                               race_date=cd, player_id=player_id,
-                                               track_distance=self.track_distance)
-                    self.player_model_list.append(player_model)
-                    print(f"Data before sync: {player_model.to_dict()}")
-
-                # to sync data to remote and local databases
-                for data in self.player_model_list:
-                    self.remote_data.update_player_data(data)
+                # synced to remote and local databases on the heat saver thread
+                self.heat_results.queue_pending_heat(player_ids)
             elif status == "Ir Sensor":
                 self.sidebar.ir_sensor_status(data=data)
             else:
                 if 'wins!!' in status:
                     print(f'oho status {status}')
-                    self.label.pack(expand=False, fill='both')
-                    self.label.configure(text=f"{self.race_type} {status}",
-                                         font=ctk.CTkFont(size=100, weight=font.BOLD, family='Helvetica'))
+                    self.show_banner(data, f"{self.race_type} {status}")
                 else:
-                    self.label.pack(expand=False, fill='both')
-                    self.label.configure(text=status,
-                                         font=ctk.CTkFont(size=100, weight=font.BOLD, family='Helvetica'))
+                    self.show_banner(data, status)
+
+    def start_countdown(self, data):
+        """ Schedule 3, 2, 1, Go a second apart from the arrival of the Start frame """
+        start_ns = data.get("host_received_ns") or host_now_ns()
+        self.timeline.cancel()
+        for second, text in enumerate(("3", "2", "1", "Go")):
+            self.timeline.schedule(start_ns + second * 1_000_000_000,
+                                   lambda text=text: self.show_countdown(text), name=f"countdown {text}",
+                                   group="countdown",
+                                   on_shown=self.report_countdown if text == "Go" else None)
+
+    def show_countdown(self, text):
+        self.set_label_expanded(True)
+        self.label.configure(text=text, font=self.fonts.get(COUNTDOWN_FONT_SIZE, font.BOLD))
+
+    def report_countdown(self):
+        latency_ms = self.timeline.stats.latest.get("countdown 3", 0) / 1e6
+        print(f"Countdown shown {latency_ms:.1f} ms after the Start frame arrived, "
+              f"frame budget {self.timeline.frame_ns / 1e6:.1f} ms")
+        print(f"Animation frames: {self.timeline.stats.report()}")
+
+    def show_banner(self, data, text):
+        # a status during the countdown (a false start, a short race) replaces what is left of it
+        self.timeline.cancel("countdown")
+        self.timeline.schedule(data.get("host_received_ns") or host_now_ns(),
+                               lambda: self.draw_banner(text), name="banner")
+
+    def draw_banner(self, text):
+        self.set_label_expanded(False)
+        self.label.configure(text=text, font=self.fonts.get(BANNER_FONT_SIZE, font.BOLD))
+
+    def set_label_expanded(self, expanded):
+        # packing again relayouts the whole frame, only do it when the label actually changes size
+        if expanded != self.label_expanded:
+            self.label.pack(expand=expanded, fill='both')
+            self.label_expanded = expanded
 
     def len(self):
         # print function for development purpose
-        return len(self.playersDataList)
+        return len(self.heat_results.players)
 
     def destroy_widget(self):
+        # a countdown or banner still pending belongs to the heat being reset
+        self.timeline.cancel()
         if self.playerWidget is not None:
             for child in self.playerWidget:
                 child.delete()
             if len(self.playerWidget) != 0:
                 print(f"list is not empty: {len(self.playerWidget)}")
                 self.playerWidget = []
-                self.playersDataList = []
-                self.player_model_list = []
             else:
                 print(f"Player widget list is empty: {len(self.playerWidget)}")
-            self.label.pack(expand=True, fill='both')
-            self.label.configure(text=self.race_headline)
+            self.heat_results.clear()
+            self.lanes_frame.pack_forget()
+            self.lanes_layout = None
+            self.reset_lanes_grid()
+            self.set_label_expanded(True)
+            self.label.configure(text=self.race_headline, font=self.fonts.get(HEADLINE_FONT_SIZE, font.BOLD))
+
+    def reset_lanes_grid(self):
+        # empty weighted columns would still take their share of the width in the next heat
+        for index in range(self.lanes_grid_size):
+            self.lanes_frame.grid_columnconfigure(index, weight=0, uniform='')
+            self.lanes_frame.grid_rowconfigure(index, weight=0)
+        self.lanes_grid_size = 0
+
+    def on_lanes_resize(self, event):
+        self.update_lanes_layout(event.width, event.height)
+
+    def update_lanes_layout(self, width=None, height=None):
+        """ Look up the precomputed layout for the current lanes and size, and apply it only if it changed """
+        if not self.playerWidget:
+            return
+        width = width or self.lanes_frame.winfo_width()
+        height = height or self.lanes_frame.winfo_height()
+
+        layout = layout_for(len(self.playerWidget), width, height)
+        if layout == self.lanes_layout:
+            return
+        self.lanes_layout = layout
+
+        self.lanes_grid_size = max(self.lanes_grid_size, len(self.playerWidget))
+        for column in range(self.lanes_grid_size):
+            self.lanes_frame.grid_columnconfigure(column, weight=1 if column < layout.columns else 0,
+                                                  uniform='lane' if column < layout.columns else '')
+        for row in range(self.lanes_grid_size):
+            self.lanes_frame.grid_rowconfigure(row, weight=1 if row < layout.rows else 0)
+
+        for index, widget in enumerate(self.playerWidget):
+            widget.apply_layout(layout, *grid_position(index, layout))
 
     def display(self, data):
 
@@ -396,20 +544,19 @@ class MainFrame(ctk.CTkFrame):
             # extracting player information
             playerData = data.get("player_info")
 
-            self.playersDataList.append(playerData)
-            self.playerWidget.append(PlayerInfo(self, 'red', playerData, self.len()))
-            time.sleep(0.1)
+            self.heat_results.add(playerData)
+            if not self.lanes_frame.winfo_ismapped():
+                self.lanes_frame.pack(expand=True, fill='both')
+            self.playerWidget.append(PlayerInfo(self.lanes_frame, playerData))
+            self.update_lanes_layout()
         else:
             pass
 
 
 class PlayerInfo(ctk.CTkFrame):
-    def __init__(self, parent, color, data, player_wid_length):
+    def __init__(self, parent, data):
         super().__init__(parent)
 
-        # player widget length
-        length = player_wid_length
-
         # player data
         player_number = data.get("player_number", "")
         player_position = data.get("position", "")
@@ -425,7 +572,10 @@ class PlayerInfo(ctk.CTkFrame):
             "OUT"
         )
 
-        color = ['red', 'green', 'blue', 'yellow'][player_number - 1] if 1 <= player_number <= 4 else 'gray'
+        color = lane_color(player_number if isinstance(player_number, int) else None)
+
+        # font sizes currently applied, set by apply_layout
+        self.font_sizes = None
 
         # configure row and columns
         self.grid_rowconfigure(5, weight=1)
@@ -440,22 +590,6 @@ class PlayerInfo(ctk.CTkFrame):
         self.dataFrame = tkinter.Frame(self, background="white", highlightthickness=1, highlightbackground='black')
         self.dataFrame.grid(row=1, column=0, sticky='new', rowspan=4)
 
-        if length <= 2:
-            # dynamic font sizes for 2 players
-            self.default_font_size = 65
-            self.default_font_size_small = 40
-            self.default_font_size_label = 18
-        elif length == 3:
-            # dynamic font sizes for 3 players
-            self.default_font_size = 85
-            self.default_font_size_small = 65
-            self.default_font_size_label = 43
-        elif length == 4:
-            # dynamic font sizes for 4 players
-            self.default_font_size = 95
-            self.default_font_size_small = 75
-            self.default_font_size_label = 53
-
         # player number
         self.playerNumber = tkinter.Label(self.dataFrame, text=f"Player {player_number}", background='gray70',
                                           borderwidth=1, relief='solid')
@@ -488,31 +622,22 @@ class PlayerInfo(ctk.CTkFrame):
         self.playerLapTimeLabel.pack(padx=2, pady=(2, 0), fill='x')
         self.playerLapTime.pack(padx=2, pady=(0, 2), fill='x')
 
-        self.pack(side='left', expand=True, fill='x', padx=(10, 10), pady=20)
-
-        self.update_fonts()
-        self.bind("<Configure>", self.on_resize)
+    def apply_layout(self, layout, row, column):
+        """ Place the lane in the grid and update fonts from a precomputed layout """
+        self.grid(row=row, column=column, sticky='new', padx=layout.padx, pady=layout.pady)
 
-    def on_resize(self, event):
-        self.update_fonts()
-
-    def update_fonts(self):
-        width = self.winfo_width()
-        height = self.winfo_height()
-
-        # Calculate font sizes based on widget size
-        font_size = max(10, int(self.default_font_size * min(width / 400, height / 300)))
-        font_size_small = max(8, int(self.default_font_size_small * min(width / 400, height / 300)))
-        font_size_label = max(6, int(self.default_font_size_label * min(width / 400, height / 300)))
+        font_sizes = (layout.font_size, layout.font_size_small, layout.font_size_label)
+        if font_sizes == self.font_sizes:
+            return
+        self.font_sizes = font_sizes
 
         # Update font sizes
-        self.playerNumber.config(font=ctk.CTkFont(size=font_size, weight=font.BOLD, family='Helvetica'))
-        self.playerStatus.config(font=ctk.CTkFont(size=font_size_small, weight=font.BOLD, family='Helvetica'))
-        self.playerResponseTimeLabel.config(font=ctk.CTkFont(size=font_size_label, weight=font.NORMAL,
-                                                             family='Helvetica'))
-        self.playerResponseTime.config(font=ctk.CTkFont(size=font_size_small, weight=font.BOLD, family='Helvetica'))
-        self.playerLapTimeLabel.config(font=ctk.CTkFont(size=font_size_label, weight=font.NORMAL, family='Helvetica'))
-        self.playerLapTime.config(font=ctk.CTkFont(size=font_size_small, weight=font.BOLD, family='Helvetica'))
+        self.playerNumber.config(font=('Helvetica', layout.font_size, 'bold'))
+        self.playerStatus.config(font=('Helvetica', layout.font_size_small, 'bold'))
+        self.playerResponseTimeLabel.config(font=('Helvetica', layout.font_size_label, 'normal'))
+        self.playerResponseTime.config(font=('Helvetica', layout.font_size_small, 'bold'))
+        self.playerLapTimeLabel.config(font=('Helvetica', layout.font_size_label, 'normal'))
+        self.playerLapTime.config(font=('Helvetica', layout.font_size_small, 'bold'))
 
     def delete(self):
         self.destroy()
@@ -535,9 +660,13 @@ class Circle(tkinter.Frame):
         self.configure(background='gray70')
         self.pack(side='bottom', )
 
-    def update_connection_status(self):
-        self.canvas.itemconfig(self.circle, fill='blue')
-        self.label.configure(text="Connected")
+    def update_connection_status(self, connected=True):
+        if connected:
+            self.canvas.itemconfig(self.circle, fill='blue')
+            self.label.configure(text="Connected")
+        else:
+            self.canvas.itemconfig(self.circle, fill='red')
+            self.label.configure(text="Disconnected")
 
     def update_ir_sensor_status(self, status=False):
         if status:
@@ -547,7 +676,7 @@ class Circle(tkinter.Frame):
 
 
 class PlayerIDDialog(ctk.CTkToplevel):
-    def __init__(self, parent, playersDataList):
+    def __init__(self, parent, playersDataList, player_lookup=None):
         super().__init__(parent)
         self.title("Enter Player IDs")
 
@@ -555,7 +684,14 @@ class PlayerIDDialog(ctk.CTkToplevel):
         self.transient(parent)
         self.grab_set()
 
+        # closing the window goes through the same checks as Confirm instead of saving empty IDs
+        self.protocol("WM_DELETE_WINDOW", self.on_confirm)
+
+        # registry snapshot loaded before the dialog opened, lookups stay in memory
+        self.player_lookup = player_lookup
+
         self.player_entries = {}  # Store entry widgets
+        self.player_hints = {}  # Store autocomplete / validation labels
         self.player_ids = {}  # Store player IDs
         self.num_players = len(playersDataList)
 
@@ -569,22 +705,73 @@ class PlayerIDDialog(ctk.CTkToplevel):
             entry = ctk.CTkEntry(self)
             entry.grid(row=index, column=1, padx=10, pady=5)
             entry.bind("<KeyRelease>", lambda event, i=index: self.on_key_release(event, i))
+            entry.bind("<Return>", lambda event, i=index: self.on_complete(event, i))
             self.player_entries[index] = entry
             self.player_ids[index] = ""  # Store IDs as they are entered
 
+            hint = ctk.CTkLabel(self, text="", width=160, anchor="w")
+            hint.grid(row=index, column=2, padx=10, pady=5)
+            self.player_hints[index] = hint
+
         # Confirm button (initially disabled)
         self.confirm_button = ctk.CTkButton(self, text="Confirm", command=self.on_confirm, state="disabled")
-        self.confirm_button.grid(row=self.num_players, column=0, columnspan=2, pady=10)
+        self.confirm_button.grid(row=self.num_players, column=0, columnspan=3, pady=10)
 
         # Autofocus the first entry
         self.player_entries[0].focus_set()
 
+    def has_registry(self):
+        # without a synced registry every 5 character ID is accepted
+        return self.player_lookup is not None and len(self.player_lookup) > 0
+
+    def is_valid(self, player_id):
+        if len(player_id) != PLAYER_ID_LENGTH:
+            return False
+        return not self.has_registry() or self.player_lookup.is_known(player_id)
+
+    def update_hint(self, index, player_id):
+        """ Show matching IDs while typing and flag unknown IDs """
+        hint = self.player_hints[index]
+        if not self.has_registry() or not player_id:
+            hint.configure(text="")
+            return
+
+        if len(player_id) == PLAYER_ID_LENGTH:
+            if self.player_lookup.is_known(player_id):
+                hint.configure(text=self.player_lookup.name(player_id) or "OK", text_color="green")
+            else:
+                hint.configure(text="Unknown ID", text_color="red")
+            return
+
+        matches = self.player_lookup.complete(player_id, limit=3)
+        if matches:
+            hint.configure(text=", ".join(matches), text_color="gray30")
+        else:
+            hint.configure(text="No match", text_color="red")
+
+    def on_complete(self, event, index):
+        """ Complete the ID when the typed prefix matches a single registered player """
+        entry = self.player_entries[index]
+        prefix = entry.get().strip()
+        if self.has_registry() and len(prefix) < PLAYER_ID_LENGTH:
+            matches = self.player_lookup.complete(prefix, limit=2)
+            if len(matches) == 1:
+                entry.delete(0, 'end')
+                entry.insert(0, matches[0])
+        self.on_key_release(event, index)
+
     def on_key_release(self, event, index):
-        """ Move focus to the next field when 5 characters are entered """
+        """ Validate against the registry and move focus to the next field when a valid ID is entered """
         entry = self.player_entries[index]
         player_id = entry.get().strip()
+        self.update_hint(index, player_id)
 
-        if len(player_id) == 5:
+        # Confirm is available once every ID is complete, unknown IDs are confirmed by askyesno
+        complete = all(len(player_entry.get().strip()) == PLAYER_ID_LENGTH
+                       for player_entry in self.player_entries.values())
+        self.confirm_button.configure(state="normal" if complete else "disabled")
+
+        if self.is_valid(player_id):
             self.player_ids[index] = player_id  # Store the ID
             next_index = index + 1
 
@@ -592,7 +779,6 @@ class PlayerIDDialog(ctk.CTkToplevel):
             if next_index < self.num_players:
                 self.player_entries[next_index].focus_set()
             else:
-                self.confirm_button.configure(state="normal")  # Enable confirm button
                 self.on_confirm()  # Auto-submit when all inputs are filled
 
     def on_confirm(self):
@@ -600,10 +786,13 @@ class PlayerIDDialog(ctk.CTkToplevel):
         for i in range(self.num_players):
             self.player_ids[i] = self.player_entries[i].get().strip()
 
-        if all(len(pid) == 5 for pid in self.player_ids.values()):  # Ensure all are valid
+        if all(self.is_valid(pid) for pid in self.player_ids.values()):  # Ensure all are valid
+            self.destroy()
+        elif not all(len(pid) == PLAYER_ID_LENGTH for pid in self.player_ids.values()):
+            messagebox.showwarning("Invalid Input", f"Each Player ID must be {PLAYER_ID_LENGTH} characters long.")
+        elif messagebox.askyesno("Unknown Player", "One or more Player IDs are not registered. Save anyway?",
+                                 parent=self):
             self.destroy()
-        else:
-            messagebox.showwarning("Invalid Input", "Each Player ID must be 5 characters long.")
 
     def get_player_ids(self):
         self.wait_window()  # Wait until the dialog is closed
@@ -0,0 +1,229 @@
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+
+# Frames of traceback kept per allocation, more frames cost more memory while tracing
+TRACE_FRAMES = 5
+
+# Growth tolerated by the soak test between the warm-up and the final snapshot
+SOAK_MAX_GROWTH_BYTES = 512 * 1024
+
+
+class MemoryDiagnostics:
+    """
+        Reports the top allocators of the running process.
+
+        Tracing starts with the first report, which becomes the baseline the
+        following reports compare against. Tracing slows every allocation, stop
+        ends it once the leak hunt is over.
+    """
+
+    def __init__(self):
+        self.baseline = None
+
+    def report(self, limit=10):
+        """
+            Takes a snapshot and lists where memory was allocated.
+
+            :param limit: Number of allocation sites to list.
+            :return: Report text.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+
+        gc.collect()
+        snapshot = filtered_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+
+        lines = [f"Traced memory: {current / 1024:,.1f} KiB (peak {peak / 1024:,.1f} KiB)"]
+        if self.baseline is None:
+            lines.append("Tracing started, the next report shows growth since now.")
+            lines.append(f"Top {limit} allocators:")
+            for stat in snapshot.statistics("lineno")[:limit]:
+                lines.append(f"  {stat}")
+        else:
+            lines.append(f"Top {limit} allocators by growth since the first report:")
+            for stat in snapshot.compare_to(self.baseline, "lineno")[:limit]:
+                lines.append(f"  {stat}")
+
+        if self.baseline is None:
+            self.baseline = snapshot
+        return "\n".join(lines)
+
+    def stop(self):
+        """ Stops tracing and drops the baseline, the next report starts over """
+        self.baseline = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            return "Memory tracing stopped."
+        return "Memory tracing was not running."
+
+
+def filtered_snapshot():
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+
+
+def heat_frames(heat, lanes, with_device_time=True):
+    """ JSON lines the Arduino sends for one heat """
+    device_time = heat * 10000
+    frames = [{"status": "Start"}]
+    for lane in range(1, lanes + 1):
+        race_time = round(random.uniform(1.5, 9.0), 3)
+        frames.append({
+            "player_info": {
+                "player_number": lane,
+                "position": lane,
+                "race_time": race_time,
+                "reaction_time": round(random.uniform(0.1, 0.6), 3),
+                "lap_time": race_time,
+                "eliminated": False,
+            },
+        })
+    frames.append({"status": "Player 1 wins!!"})
+    frames.append({"status": "Race finished"})
+    frames.append({"status": "Ir Sensor", "details": {"player": 1, "ir_sensor_status": heat % 2 == 0}})
+    frames.append({"status": "Reset"})
+
+    if with_device_time:
+        for index, frame in enumerate(frames):
+            frame["device_time"] = device_time + index * 250
+    return [json.dumps(frame) for frame in frames]
+
+
+def replay_window_frame(heat_results, frame, player_ids):
+    """
+        Does with a frame what MainFrame does with the heat lists, the player ID dialog answering player_ids.
+
+        :return: Results of the heat if the frame finished it, None otherwise.
+    """
+    if isinstance(frame.get("player_info"), dict):
+        heat_results.add(frame["player_info"])
+    status = frame.get("status")
+    if status == "Race finished":
+        players = heat_results.finish("Gravity car", 20.0)
+        heat_results.queue_pending_heat(player_ids[:len(players)])
+        return players
+    if status == "Reset":
+        heat_results.clear()
+    return None
+
+
+def heat_lists_left(heat_results):
+    """ Results still held once a heat was reset, anything but 0 grows with every heat """
+    with heat_results.lock:
+        return len(heat_results.players) + (heat_results.pending_heat is not None)
+
+
+def soak(heats, lanes, warmup):
+    """
+        Replays heats through the serial dispatch path into the race state and local database,
+        and the way the window keeps them, and checks that traced memory does not grow once
+        warmed up and that no heat is left in the lists after its reset.
+
+        :return: True if memory stayed flat.
+    """
+    from local_data import LocalData
+    from race_state import HeadlessRace, HeatResults, RaceState
+    from serial_communication import SerialCommunication
+    from settings import get_settings
+    from timing import host_now_ns
+
+    with tempfile.TemporaryDirectory() as directory:
+        local_data = LocalData(os.path.join(directory, "soak.db"))
+
+        class LocalStore:
+            @staticmethod
+            def update_player_data(player_model):
+                local_data.save_locally(player_model)
+
+        race_state = RaceState(race_type="Gravity car", headline="Get Ready Drivers")
+        headless_race = HeadlessRace(race_state, LocalStore(), "Gravity car", 20.0)
+        serial_communication = SerialCommunication(None, get_settings().serial.baud_rate,
+                                                   headless_race.display,
+                                                   lambda message, is_success: None,
+                                                   headless_race.status_update,
+                                                   lambda: None,
+                                                   start=False)
+        window_results = HeatResults(LocalStore())
+
+        tracemalloc.start(TRACE_FRAMES)
+        baseline = None
+        heats_left = 0
+        for heat in range(heats):
+            player_ids = [f"{(heat * lanes + lane) % 100000:05d}" for lane in range(lanes)]
+            finished = []
+            for line in heat_frames(heat, lanes):
+                serial_communication.dispatch(line, host_now_ns())
+                finished.append(replay_window_frame(window_results, json.loads(line), player_ids))
+
+            # a finished heat holding results of earlier heats, or results left after the reset, grow every heat
+            finished_sizes = [len(players) for players in finished if players is not None]
+            if (finished_sizes != [lanes] or heat_lists_left(headless_race.heat_results)
+                    or heat_lists_left(window_results)):
+                heats_left += 1
+
+            if heat + 1 == warmup:
+                gc.collect()
+                baseline = filtered_snapshot()
+
+        # wait for the heats queued on the saver threads
+        for heat_results in (headless_race.heat_results, window_results):
+            heat_results.stop()
+            heat_results.save_thread.join()
+
+        gc.collect()
+        final = filtered_snapshot()
+        tracemalloc.stop()
+
+        rows = local_data.get_connection().execute("SELECT COUNT(*) FROM player_data").fetchone()[0]
+        local_data.close_connection()
+        local_data.writer.stop()
+        local_data.writer.thread.join()
+
+    growth = sum(stat.size_diff for stat in final.compare_to(baseline, "filename"))
+    print(f"Replayed {heats} heats of {lanes} lanes headless and as the window does, {rows} results saved")
+    print(f"Traced memory growth after {warmup} warm-up heats: {growth / 1024:,.1f} KiB "
+          f"(limit {SOAK_MAX_GROWTH_BYTES / 1024:,.0f} KiB)")
+    print("Top growth:")
+    for stat in final.compare_to(baseline, "lineno")[:10]:
+        print(f"  {stat}")
+
+    if heats_left:
+        print(f"{heats_left} heats kept results of earlier heats or left results after their reset")
+        return False
+    if rows != 2 * heats * lanes:
+        print(f"Expected {2 * heats * lanes} saved results")
+        return False
+    return growth <= SOAK_MAX_GROWTH_BYTES
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory diagnostics")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    soak_parser = commands.add_parser("soak", help="replay heats and check that memory stays flat")
+    soak_parser.add_argument("--heats", type=int, default=5000)
+    soak_parser.add_argument("--lanes", type=int, default=2)
+    soak_parser.add_argument("--warmup", type=int, default=500)
+
+    commands.add_parser("report", help="print the top allocators of this process")
+
+    args = parser.parse_args()
+    if args.command == "soak":
+        sys.exit(0 if soak(args.heats, args.lanes, min(args.warmup, args.heats)) else 1)
+    else:
+        print(MemoryDiagnostics().report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import gzip
+import json
+
+# Fields shared by every result of the same race session, sent once per session
+SESSION_FIELDS = ("race_type", "race_date", "track_distance")
+
+# Fields that change per result, sent as positional rows
+RESULT_FIELDS = ("player_id", "position", "race_time", "reaction_time", "lap_time", "eliminated")
+
+# Content type of the grouped upload body
+CONTENT_TYPE = "application/vnd.race-results+json"
+ENCODING_VERSION = 1
+
+
+def encode_plain(results):
+    """
+        Encodes results the way they are inserted row by row, one JSON object per result.
+
+        :param results: List of result dictionaries (see PlayerModel.to_sync_dict).
+        :return: UTF-8 encoded JSON body.
+    """
+    return json.dumps(list(results)).encode("utf-8")
+
+
+def group_results(results):
+    """
+        Groups results by race session so the shared fields are only stored once.
+
+        :param results: List of result dictionaries.
+        :return: Dictionary in the grouped upload layout.
+    """
+    sessions = {}
+    for result in results:
+        key = tuple(result.get(field) for field in SESSION_FIELDS)
+        sessions.setdefault(key, []).append([result.get(field) for field in RESULT_FIELDS])
+
+    return {
+        "v": ENCODING_VERSION,
+        "session_fields": SESSION_FIELDS,
+        "fields": RESULT_FIELDS,
+        "sessions": [{"session": list(key), "rows": rows} for key, rows in sessions.items()],
+    }
+
+
+def encode_results(results, compress_level=9):
+    """
+        Encodes results grouped by session and gzip compresses the body.
+
+        :param results: List of result dictionaries.
+        :param compress_level: gzip compression level (1 fastest, 9 smallest).
+        :return: Compressed request body.
+    """
+    body = json.dumps(group_results(results), separators=(",", ":")).encode("utf-8")
+    return gzip.compress(body, compresslevel=compress_level)
+
+
+def decode_results(payload, compressed=True):
+    """
+        Decodes a grouped upload body back into a flat list of result dictionaries.
+
+        :param payload: Request body produced by encode_results.
+        :param compressed: Whether the body is gzip compressed.
+        :return: List of result dictionaries.
+    """
+    if compressed:
+        payload = gzip.decompress(payload)
+    body = json.loads(payload.decode("utf-8"))
+
+    if body.get("v") != ENCODING_VERSION:
+        raise ValueError(f"Unsupported payload version: {body.get('v')}")
+
+    session_fields = body["session_fields"]
+    fields = body["fields"]
+    results = []
+    for session in body["sessions"]:
+        shared = dict(zip(session_fields, session["session"]))
+        for row in session["rows"]:
+            result = dict(zip(fields, row))
+            result.update(shared)
+            results.append(result)
+    return results
+
+
+def upload_headers():
+    return {
+        "Content-Type": CONTENT_TYPE,
+        "Content-Encoding": "gzip",
+    }
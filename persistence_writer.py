@@ -0,0 +1,189 @@
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from settings import get_settings
+
+_STOP = object()
+
+# Seconds between checks that the writer thread is still alive while a caller waits
+ALIVE_CHECK_INTERVAL = 1.0
+
+
+class PersistenceWriter:
+    """
+        Single thread owning the only writable connection to a database file.
+
+        Callers submit commands through a queue and get a Future back. Whatever is
+        queued while a commit is in progress is executed and committed together,
+        so concurrent writers share commits instead of contending for the file lock.
+    """
+
+    _writers = {}
+    _writers_lock = threading.Lock()
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.commands = queue.Queue()
+        self.lock = threading.Lock()
+        self.stopped = False
+        self.commits = 0
+        self.commands_executed = 0
+
+        # database settings waiting to be applied between two batches
+        self.pending_settings = None
+
+        # transactions are managed explicitly so a batch is one transaction
+        self.connection = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.apply_pragmas(self.connection, get_settings().database)
+
+        self.thread = threading.Thread(target=self.run, name="persistence writer")
+        self.thread.daemon = True
+        self.thread.start()
+
+    @classmethod
+    def for_path(cls, db_path):
+        """ Returns the writer of a database file, starting it on first use """
+        with cls._writers_lock:
+            writer = cls._writers.get(db_path)
+            if writer is None or writer.stopped:
+                writer = cls(db_path)
+                cls._writers[db_path] = writer
+            return writer
+
+    @staticmethod
+    def apply_pragmas(conn, database_settings):
+        conn.execute(f"PRAGMA journal_mode={database_settings.journal_mode}")
+        conn.execute(f"PRAGMA synchronous={database_settings.synchronous}")
+        conn.execute(f"PRAGMA cache_size={int(database_settings.cache_size)}")
+
+    def reconfigure(self, settings):
+        """ Applies changed pragmas on the writer thread before its next batch """
+        self.pending_settings = settings.database
+        try:
+            # wakes the writer so the pragmas apply even when nothing else is written
+            self.submit(lambda conn: None)
+        except RuntimeError:
+            pass
+
+    def submit(self, command):
+        """
+            Queues a command for the writer thread.
+
+            :param command: Callable taking the connection, its return value resolves the Future.
+            :return: Future resolved once the command has been committed.
+        """
+        future = Future()
+        with self.lock:
+            if self.stopped:
+                raise RuntimeError(f"Persistence writer for {self.db_path} is stopped")
+            self.commands.put((command, future))
+        return future
+
+    def call(self, command):
+        """ Runs a command on the writer thread and waits until it is committed """
+        future = self.submit(command)
+        while True:
+            try:
+                return future.result(timeout=ALIVE_CHECK_INTERVAL)
+            except FutureTimeoutError:
+                # a dead writer would never resolve the future, fail instead of blocking the caller
+                if not self.thread.is_alive():
+                    raise RuntimeError(f"Persistence writer for {self.db_path} is not running")
+
+    def execute(self, sql, params=()):
+        return self.call(lambda conn: conn.execute(sql, params).rowcount)
+
+    def executemany(self, sql, rows):
+        return self.call(lambda conn: conn.executemany(sql, rows).rowcount)
+
+    def stop(self):
+        """ Stops accepting commands, everything already queued is still written """
+        with self.lock:
+            if not self.stopped:
+                self.stopped = True
+                self.commands.put(_STOP)
+
+    def run(self):
+        try:
+            self.write_until_stopped()
+        finally:
+            # whatever is still queued can no longer be written, fail it instead of leaving callers waiting
+            with self.lock:
+                self.stopped = True
+            self.fail_queued(RuntimeError(f"Persistence writer for {self.db_path} stopped"))
+            self.connection.close()
+        print(f"Persistence writer closed after {self.commits} commits, {self.commands_executed} commands")
+
+    def fail_queued(self, error):
+        while True:
+            try:
+                item = self.commands.get_nowait()
+            except queue.Empty:
+                return
+            if item is not _STOP:
+                item[1].set_exception(error)
+
+    def write_until_stopped(self):
+        running = True
+        while running:
+            batch = [self.commands.get()]
+            max_batch = get_settings().database.max_batch
+            while len(batch) < max_batch:
+                try:
+                    batch.append(self.commands.get_nowait())
+                except queue.Empty:
+                    break
+
+            # nothing can be queued after the stop marker, so the batch before it is the last one
+            if _STOP in batch:
+                running = False
+                batch = batch[:batch.index(_STOP)]
+
+            # pragmas such as synchronous can not change inside a transaction
+            pending_settings, self.pending_settings = self.pending_settings, None
+            if pending_settings is not None:
+                try:
+                    self.apply_pragmas(self.connection, pending_settings)
+                except sqlite3.Error as e:
+                    print(f"Failed to apply database settings: {e}")
+
+            if batch:
+                self.write_batch(batch)
+
+    def write_batch(self, batch):
+        try:
+            results = self.execute_batch(batch)
+            self.connection.execute("COMMIT")
+            self.commits += 1
+            self.commands_executed += len(batch)
+        except Exception as e:
+            # BEGIN, a rollback after SQLITE_FULL or IOERR, or COMMIT failed: the whole batch is lost
+            if self.connection.in_transaction:
+                try:
+                    self.connection.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+            results = [(future, None, e) for _, future in batch]
+
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def execute_batch(self, batch):
+        results = []
+        self.connection.execute("BEGIN")
+        for command, future in batch:
+            # a savepoint per command lets one failing command roll back alone
+            self.connection.execute("SAVEPOINT command")
+            try:
+                results.append((future, command(self.connection), None))
+                self.connection.execute("RELEASE command")
+            except Exception as e:
+                self.connection.execute("ROLLBACK TO command")
+                self.connection.execute("RELEASE command")
+                results.append((future, None, e))
+        return results
@@ -1,6 +1,8 @@
 class PlayerModel:
     def __init__(self, player_number, position, race_time, reaction_time, lap_time,
-                 eliminated, race_type=None, race_date=None, player_id=None, track_distance=None):
+                 eliminated, race_type=None, race_date=None, player_id=None, track_distance=None,
+                 host_received_ns=None, race_time_corrected=None, reaction_time_corrected=None,
+                 lap_time_corrected=None):
         self.player_id = player_id
         self.player_number = player_number
         self.position = position
@@ -12,6 +14,12 @@ class PlayerModel:
         self.race_date = race_date
         self.track_distance = track_distance
 
+        # host arrival time of the result frame and timings corrected for the Arduino's clock drift
+        self.host_received_ns = host_received_ns
+        self.race_time_corrected = race_time_corrected
+        self.reaction_time_corrected = reaction_time_corrected
+        self.lap_time_corrected = lap_time_corrected
+
     def __repr__(self):
         return (f"PlayerInfo(player_id={self.player_id}, player_number={self.player_number}, position={self.position}, "
                 f"race_time={self.race_time}, reaction_time={self.reaction_time}, "
@@ -31,6 +39,10 @@ class PlayerModel:
             "eliminated": self.eliminated,
             "race_type": self.race_type,
             "race_date": self.race_date,
+            "host_received_ns": self.host_received_ns,
+            "race_time_corrected": self.race_time_corrected,
+            "reaction_time_corrected": self.reaction_time_corrected,
+            "lap_time_corrected": self.lap_time_corrected,
         }
 
     def to_sync_dict(self):
@@ -0,0 +1,109 @@
+import time
+from bisect import bisect_left
+
+from local_data import LocalData
+from settings import get_settings
+
+# Player ID length expected by the dialog
+PLAYER_ID_LENGTH = 5
+
+
+class PlayerLookup:
+    """ In-memory snapshot of the registry, so lookups never touch the disk or network """
+
+    def __init__(self, players):
+        self.names = dict(players)
+        self.player_ids = sorted(self.names)
+
+    def __len__(self):
+        return len(self.player_ids)
+
+    def is_known(self, player_id):
+        return player_id in self.names
+
+    def name(self, player_id):
+        return self.names.get(player_id)
+
+    def complete(self, prefix, limit=5):
+        """
+            Returns the registered IDs starting with the given prefix.
+
+            :param prefix: Characters typed so far.
+            :param limit: Maximum number of suggestions.
+            :return: Sorted list of matching player IDs.
+        """
+        matches = []
+        index = bisect_left(self.player_ids, prefix)
+        while index < len(self.player_ids) and len(matches) < limit:
+            player_id = self.player_ids[index]
+            if not player_id.startswith(prefix):
+                break
+            matches.append(player_id)
+            index += 1
+        return matches
+
+
+class PlayerRegistry:
+    def __init__(self, local_data=None):
+        self.local_data = local_data or LocalData()
+        self.local_data.writer.call(self.create_registry_table)
+
+    @staticmethod
+    def create_registry_table(conn):
+        cursor = conn.cursor()
+
+        # player_id is the primary key, a bulk sync updates players in place
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS player_registry (
+                player_id TEXT PRIMARY KEY,
+                player_name TEXT,
+                last_seen REAL)
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS player_registry_sync (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                synced_at REAL)
+        ''')
+
+    def last_synced_at(self):
+        conn = self.local_data.get_connection()
+        row = conn.execute("SELECT synced_at FROM player_registry_sync WHERE id = 1").fetchone()
+        return row[0] if row else None
+
+    def needs_refresh(self, now=None):
+        synced_at = self.last_synced_at()
+        now = time.time() if now is None else now
+        # refresh from the backend when the last bulk sync is older than the interval
+        return synced_at is None or now - synced_at >= get_settings().sync.registry_refresh_interval
+
+    def replace_all(self, players, now=None):
+        """
+            Stores a bulk sync from the backend and evicts players that have not been seen for a while.
+
+            :param players: Iterable of (player_id, player_name) tuples.
+            :param now: Sync timestamp, defaults to the current time.
+            :return: Number of players stored.
+        """
+        now = time.time() if now is None else now
+        # players not returned by a bulk sync for this long are evicted from the cache
+        evict_before = now - get_settings().sync.registry_evict_after
+        rows = [(str(player_id).strip(), player_name, now) for player_id, player_name in players if player_id]
+
+        def store(conn):
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO player_registry (player_id, player_name, last_seen) VALUES (?, ?, ?)
+                ON CONFLICT(player_id) DO UPDATE SET player_name = excluded.player_name,
+                last_seen = excluded.last_seen
+            ''', rows)
+            cursor.execute("DELETE FROM player_registry WHERE last_seen < ?", (evict_before,))
+            cursor.execute("INSERT OR REPLACE INTO player_registry_sync (id, synced_at) VALUES (1, ?)", (now,))
+
+        self.local_data.writer.call(store)
+        return len(rows)
+
+    def snapshot(self):
+        """ Loads the whole registry into a PlayerLookup, done once when the dialog opens """
+        conn = self.local_data.get_connection()
+        rows = conn.execute("SELECT player_id, player_name FROM player_registry").fetchall()
+        return PlayerLookup(rows)
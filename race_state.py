@@ -0,0 +1,270 @@
+import copy
+import queue
+import threading
+from datetime import datetime
+
+from player_model import PlayerModel
+from player_registry import PLAYER_ID_LENGTH
+
+# Keys of a player_info frame that are only meaningful inside this process
+PRIVATE_PLAYER_KEYS = ("host_received_ns",)
+
+
+def merge_patch(old, new):
+    """
+        Computes a JSON merge patch (RFC 7386) turning old into new.
+
+        :param old: Previous state dictionary.
+        :param new: Current state dictionary.
+        :return: Patch dictionary, empty if nothing changed. Removed keys map to None.
+    """
+    patch = {}
+    for key in old:
+        if key not in new:
+            patch[key] = None
+    for key, value in new.items():
+        if key not in old:
+            patch[key] = copy.deepcopy(value)
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            nested = merge_patch(old[key], value)
+            if nested:
+                patch[key] = nested
+        elif value != old[key]:
+            patch[key] = copy.deepcopy(value)
+    return patch
+
+
+class RaceState:
+    """
+        Live race state built from the serial frames, independent of the UI.
+
+        Every change bumps the version and is passed to the listeners as a merge
+        patch, so viewers only receive what changed.
+    """
+
+    def __init__(self, race_type=None, headline=None):
+        self.lock = threading.Lock()
+        self.version = 0
+        self.listeners = []
+        self.state = {
+            "race_type": race_type,
+            "headline": headline,
+            "connected": False,
+            "connection": "",
+            "status": None,
+            "players": {},
+        }
+
+    def add_listener(self, listener):
+        """ listener(version, patch) is called on the thread that changed the state """
+        self.listeners.append(listener)
+
+    def snapshot(self):
+        with self.lock:
+            return self.version, copy.deepcopy(self.state)
+
+    def update(self, change):
+        """
+            Applies a change to a copy of the state and notifies listeners with the difference.
+
+            :param change: Callable mutating the state dictionary in place.
+            :return: The merge patch, empty if the change did not modify anything.
+        """
+        with self.lock:
+            new_state = copy.deepcopy(self.state)
+            change(new_state)
+            patch = merge_patch(self.state, new_state)
+            if not patch:
+                return patch
+            self.state = new_state
+            self.version += 1
+            version = self.version
+
+        for listener in self.listeners:
+            listener(version, patch)
+        return patch
+
+    def on_player_info(self, data):
+        player_info = data.get("player_info")
+        if not isinstance(player_info, dict):
+            return
+        player = {key: value for key, value in player_info.items() if key not in PRIVATE_PLAYER_KEYS}
+
+        def change(state):
+            state["players"][str(player.get("player_number"))] = player
+        self.update(change)
+
+    def on_status(self, data):
+        status = data.get("status", "")
+
+        def change(state):
+            if status == "Reset" or status == "Start":
+                state["players"] = {}
+            if status == "Ir Sensor":
+                details = data.get("details", {})
+                if isinstance(details, dict):
+                    state.setdefault("ir_sensors", {})[str(details.get("player"))] = details.get("ir_sensor_status")
+                return
+            state["status"] = status
+        self.update(change)
+
+    def on_connection(self, connected, message):
+        def change(state):
+            state["connected"] = connected
+            state["connection"] = message
+        self.update(change)
+
+    def players(self):
+        with self.lock:
+            return [copy.deepcopy(player) for player in self.state["players"].values()]
+
+
+def check_player_ids(player_ids):
+    """
+        :param player_ids: Player IDs as received from a client, None for none.
+        :return: The player IDs as a list.
+        :raises ValueError: If player_ids is not a list of PLAYER_ID_LENGTH character strings.
+    """
+    if player_ids is None:
+        return []
+    if not isinstance(player_ids, list):
+        raise ValueError("Player IDs must be a list")
+    for player_id in player_ids:
+        if not isinstance(player_id, str) or len(player_id) != PLAYER_ID_LENGTH:
+            raise ValueError(f"Player ID {player_id!r} is not {PLAYER_ID_LENGTH} characters long")
+    return list(player_ids)
+
+
+class HeatResults:
+    """
+        Results of the heat in progress and the finished heat waiting for player IDs, without Tk.
+
+        MainFrame and HeadlessRace both keep their per-heat lists here, so the soak test
+        in memory_diagnostics covers the lists of the window as well. Finished heats are
+        saved on a thread of their own, uploading one can take seconds and must hold back
+        neither the frames of the next heat nor the window.
+
+        remote_data is anything with update_player_data(player_model), normally RemoteData.
+    """
+
+    def __init__(self, remote_data, lifecycle=None):
+        self.remote_data = remote_data
+
+        self.lock = threading.Lock()
+        self.players = []
+
+        # finished heat waiting for player IDs, saved without IDs if the next heat starts first
+        self.pending_heat = None
+
+        # heats handed over with their player IDs, None stops the saver once the queue is empty
+        self.heats_to_save = queue.Queue()
+        self.save_thread = threading.Thread(target=self.save_heats, name="heat saver")
+        self.save_thread.daemon = True
+        self.save_thread.start()
+
+        if lifecycle is not None:
+            # signalled once the serial dispatcher has finished, frames still queued may finish a heat
+            lifecycle.register("heat saver", stop=self.stop, thread=self.save_thread, signal_first=False)
+
+    def add(self, player_info):
+        with self.lock:
+            self.players.append(player_info)
+
+    def clear(self):
+        """ Starts a new heat, the one waiting for player IDs is saved without them """
+        self.queue_pending_heat()
+        with self.lock:
+            self.players = []
+
+    def finish(self, race_type, track_distance):
+        """
+            Ends the heat in progress, it waits for player IDs until the next heat starts.
+
+            :return: Results of the finished heat, in the order they arrived.
+        """
+        self.queue_pending_heat()
+        with self.lock:
+            players, self.players = self.players, []
+            self.pending_heat = (datetime.now().date().strftime('%Y-%m-%d'), race_type, track_distance, players)
+        return list(players)
+
+    def queue_pending_heat(self, player_ids=None):
+        """
+            Hands the finished heat to the saver thread.
+
+            :param player_ids: Player IDs in the order the results arrived, None leaves them empty.
+            :return: Number of results queued, 0 if no heat was waiting.
+            :raises ValueError: If there are more player IDs than results, the heat is left waiting.
+        """
+        with self.lock:
+            if self.pending_heat is not None and player_ids and len(player_ids) > len(self.pending_heat[3]):
+                raise ValueError(f"{len(player_ids)} player IDs for {len(self.pending_heat[3])} results")
+            pending, self.pending_heat = self.pending_heat, None
+        if pending is None:
+            return 0
+        self.heats_to_save.put((pending, player_ids))
+        return len(pending[3])
+
+    def save_heats(self):
+        while True:
+            heat = self.heats_to_save.get()
+            if heat is None:
+                break
+            try:
+                self.save_heat(*heat)
+            except Exception as e:
+                print(f"Failed to save heat: {e}")
+
+    def stop(self):
+        """ Stops the saver after the heats already queued and the one waiting for player IDs are saved """
+        self.queue_pending_heat()
+        self.heats_to_save.put(None)
+
+    def save_heat(self, pending, player_ids=None):
+        race_date, race_type, track_distance, players = pending
+        player_ids = list(player_ids or [])
+        for index, player_dict in enumerate(players):
+            player_id = player_ids[index] if index < len(player_ids) else None
+            player_model = PlayerModel(**player_dict, race_type=race_type, race_date=race_date,
+                                       player_id=player_id, track_distance=track_distance)
+            self.remote_data.update_player_data(player_model)
+        return len(players)
+
+
+class HeadlessRace:
+    """ Serial ingest and persistence without Tk, mirroring what MainFrame does with the frames """
+
+    def __init__(self, race_state, remote_data, race_type, track_distance, lifecycle=None):
+        self.race_state = race_state
+        self.race_type = race_type
+        self.track_distance = track_distance
+        self.heat_results = HeatResults(remote_data, lifecycle=lifecycle)
+
+    def display(self, data):
+        player_info = data.get("player_info")
+        if isinstance(player_info, dict):
+            self.heat_results.add(player_info)
+        self.race_state.on_player_info(data)
+
+    def status_update(self, data):
+        # viewers get the change first, saving the previous heat happens on the saver thread
+        self.race_state.on_status(data)
+
+        status = data.get("status", "")
+        if status in ("Start", "Reset"):
+            self.heat_results.clear()
+        elif status == "Race finished":
+            self.heat_results.finish(self.race_type, self.track_distance)
+
+    def stop(self):
+        self.heat_results.stop()
+
+    def save_pending_heat(self, player_ids=None):
+        """
+            Saves the last finished heat on the saver thread.
+
+            :param player_ids: Player IDs in the order the results arrived, None leaves them empty.
+            :return: Number of results queued to be saved.
+            :raises ValueError: If player_ids is not a list of player IDs, the heat is left pending.
+        """
+        return self.heat_results.queue_pending_heat(check_player_ids(player_ids))
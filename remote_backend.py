@@ -0,0 +1,191 @@
+import os
+import threading
+
+import requests
+
+from payload_encoding import encode_results, upload_headers
+from settings import get_settings
+
+BACKENDS = ("supabase", "stand_in")
+
+
+class BackendError(Exception):
+    """
+        A remote call that failed.
+
+        :param retry_after: Seconds the backend asked to wait before retrying, None if it did not say.
+        :param status: HTTP status the backend answered with, None if it was not reached.
+    """
+
+    def __init__(self, message, retry_after=None, status=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status = status
+
+    @property
+    def retryable(self):
+        """ False if the backend refused the request itself, sending it again can not succeed """
+        return self.status is None or self.status == 429 or self.status >= 500
+
+
+class RemoteBackend:
+    """ Where RemoteData syncs results to and loads the player registry from """
+
+    def is_reachable(self):
+        return True
+
+    def insert_results(self, results):
+        """
+            Stores a batch of results, raising BackendError if it was not accepted.
+
+            :param results: List of result dictionaries (see PlayerModel.to_sync_dict).
+        """
+        raise NotImplementedError
+
+    def fetch_players(self, start, end):
+        """ :return: Player dictionaries with player_id and player_name, rows start to end inclusive. """
+        raise NotImplementedError
+
+    def call_function(self, function_name, params=None):
+        """ Runs a stored function and returns its data """
+        raise NotImplementedError
+
+
+def post_results(url, results, session=None):
+    """ Uploads results grouped by session and gzip compressed, raising BackendError if refused """
+    try:
+        response = (session or requests).post(url, data=encode_results(results), headers=upload_headers(),
+                                              timeout=30)
+    except requests.exceptions.RequestException as e:
+        raise BackendError(f"Failed to upload results: {e}")
+    raise_for_status(response)
+
+
+def raise_for_status(response):
+    if response.ok:
+        return
+    retry_after = response.headers.get("Retry-After")
+    try:
+        retry_after = float(retry_after) if retry_after is not None else None
+    except ValueError:
+        retry_after = None
+    raise BackendError(f"{response.status_code} {response.reason}", retry_after=retry_after,
+                       status=response.status_code)
+
+
+def api_error_status(error):
+    """ HTTP status class of a PostgREST error raised by the Supabase client, None for anything else """
+    from postgrest.exceptions import APIError
+
+    if not isinstance(error, APIError):
+        return None
+    # PGRST000 to PGRST003 mean PostgREST could not reach the database, the rest refuse the request
+    return 503 if str(error.code or "").startswith("PGRST00") else 400
+
+
+class SupabaseBackend(RemoteBackend):
+    """
+        Results, player registry and stored functions in Supabase.
+
+        The client is created on first use from SUPABASE_URL and SUPABASE_KEY, so
+        importing the sync code needs neither the credentials nor a connection.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._client = None
+
+    @property
+    def client(self):
+        with self.lock:
+            if self._client is None:
+                # imported here so the stand-in backend runs without the Supabase packages
+                from dotenv import load_dotenv
+                from supabase import create_client
+
+                load_dotenv()
+                url = os.environ.get("SUPABASE_URL")
+                key = os.environ.get("SUPABASE_KEY")
+                if not url or not key:
+                    raise BackendError("SUPABASE_URL and SUPABASE_KEY are not set")
+                self._client = create_client(url, key)
+            return self._client
+
+    def is_reachable(self):
+        try:
+            response = requests.get('https://www.google.com', timeout=5)
+            return response.status_code == 200
+        except requests.exceptions.ReadTimeout:
+            print("Connection timed out. Internet may be slow or unavailable.")
+            return False
+        except requests.exceptions.RequestException as e:
+            print(f"An error occurred: {e}")
+            return False
+
+    def insert_results(self, results):
+        sync_settings = get_settings().sync
+        if sync_settings.ingest_url:
+            post_results(sync_settings.ingest_url, results)
+            return
+
+        try:
+            response = self.client.table(sync_settings.results_table).insert(results).execute()
+        except BackendError:
+            raise
+        except Exception as e:
+            raise BackendError(f"Insert failed: {e}", status=api_error_status(e))
+        if not response.data:
+            raise BackendError("Insert returned no rows")
+
+    def fetch_players(self, start, end):
+        response = (self.client.table(get_settings().sync.player_registry_table)
+                    .select("player_id, player_name").range(start, end).execute())
+        return response.data or []
+
+    def call_function(self, function_name, params=None):
+        return self.client.rpc(function_name, params or {}).execute().data
+
+
+class StandInBackend(RemoteBackend):
+    """ The local stand-in server (stand_in_server.py), for running the sync path offline """
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        # one keep-alive connection per thread instead of a new one per request
+        self.thread_local = threading.local()
+
+    @property
+    def session(self):
+        if not hasattr(self.thread_local, "session"):
+            self.thread_local.session = requests.Session()
+        return self.thread_local.session
+
+    def is_reachable(self):
+        try:
+            return self.session.get(f"{self.base_url}/health", timeout=5).ok
+        except requests.exceptions.RequestException as e:
+            print(f"Stand-in backend unreachable: {e}")
+            return False
+
+    def insert_results(self, results):
+        post_results(f"{self.base_url}/results", results, self.session)
+
+    def fetch_players(self, start, end):
+        response = self.session.get(f"{self.base_url}/players", params={"start": start, "end": end}, timeout=30)
+        raise_for_status(response)
+        return response.json()
+
+    def call_function(self, function_name, params=None):
+        response = self.session.post(f"{self.base_url}/rpc/{function_name}", json=params or {}, timeout=30)
+        raise_for_status(response)
+        return response.json()
+
+
+def create_backend(sync_settings=None):
+    """ Backend named by sync.backend in config.json """
+    sync_settings = sync_settings or get_settings().sync
+    if sync_settings.backend == "stand_in":
+        return StandInBackend(sync_settings.stand_in_url)
+    if sync_settings.backend != "supabase":
+        print(f"Unknown sync backend {sync_settings.backend}, expected one of {BACKENDS}, using supabase")
+    return SupabaseBackend()
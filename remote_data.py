@@ -1,135 +1,250 @@
 import time
 import threading
-import requests
-from supabase import create_client
-from dotenv import load_dotenv
-import os
+from collections import deque
 from local_data import LocalData
+from player_registry import PlayerRegistry
+from remote_backend import BackendError, create_backend
+from settings import get_settings
 
-load_dotenv()
+# Position of host_received_ns (wall clock nanoseconds) in a player_data row
+RECEIVED_NS_COLUMN = 11
 
-# Constants
-SUPABASE_URL = os.environ.get("SUPABASE_URL")
-SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
+# Per result lags kept for the sync statistics
+SYNC_LAG_SAMPLES = 100000
 
-# Initialize Supabase Client
-supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+class SyncStats:
+    """ Counters of the sync engine, and how long results waited between arriving and being synced """
 
-class RemoteData:
     def __init__(self):
+        self.lock = threading.Lock()
+        self.synced = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.rejected = 0
+        self.retries = 0
+        self.lags_ns = deque(maxlen=SYNC_LAG_SAMPLES)
+
+    def record_batch(self, records):
+        now_ns = time.time_ns()
+        with self.lock:
+            self.synced += len(records)
+            self.batches += 1
+            self.lags_ns.extend(now_ns - record[RECEIVED_NS_COLUMN] for record in records
+                                if len(record) > RECEIVED_NS_COLUMN and record[RECEIVED_NS_COLUMN])
+
+
+class RemoteData:
+    def __init__(self, lifecycle=None, backend=None, local_data=None, start=True):
+        """
+            :param backend: RemoteBackend to sync with, the one named in config.json if None.
+            :param local_data: LocalData to sync from, the configured database if None.
+            :param start: Start the sync thread, False leaves calling sync_pending to the caller.
+        """
+
+        # set to stop the sync loop, it finishes the record in flight first
+        self.stop_event = threading.Event()
+
+        # Supabase or the local stand-in, created lazily so nothing connects at import
+        self.backend = backend or create_backend()
+        self.sync_stats = SyncStats()
 
         # Initializing local data class
-        self.local_data = LocalData()
+        self.local_data = local_data or LocalData()
+
+        # Locally cached player registry used by the player ID dialog
+        self.player_registry = PlayerRegistry(self.local_data)
 
         # Start the background sync thread
         self.sync_thread = threading.Thread(target=self.automated_sync_data)
         self.sync_thread.daemon = True
-        self.sync_thread.start()
+        if start:
+            self.sync_thread.start()
 
-        # Initialize the LocalData instance
-        self.local_data = LocalData()
+            if lifecycle is not None:
+                lifecycle.register("sync loop", stop=self.stop, thread=self.sync_thread)
 
-    @staticmethod
-    def check_internet():
-        try:
-            response = requests.get('https://www.google.com', timeout=5)
-            return response.status_code == 200
-        except requests.exceptions.ReadTimeout:
-            print("Connection timed out. Internet may be slow or unavailable.")
-            return False
-        except requests.exceptions.RequestException as e:
-            print(f"An error occurred: {e}")
-            return False
+    def stop(self):
+        self.stop_event.set()
+
+    def check_internet(self):
+        return self.backend.is_reachable()
 
     def automated_sync_data(self):
         print("Starting automated sync thread...")
-        while True:
+        while not self.stop_event.is_set():
             try:
                 start_time = time.time()
                 print("Checking internet connection...")
                 if self.check_internet():
                     print("Internet connection detected.")
-                    data = self.local_data.fetch_all_data()
-                    print(f"Fetched local data: {data}")
-                    all_synced = True  # Flag to check if all records synced successfully
-                    for record in data:
-                        player_data = {
-                            "player_id": record[1],
-                            "race_date": record[2],
-                            "race_type": record[3],
-                            "position": record[4],
-                            "race_time": record[5],
-                            "reaction_time": record[6],
-                            "lap_time": record[7],
-                            "track_distance": record[8],
-                            "eliminated": record[9],
-                        }
-                        try:
-                            result = supabase_client.table("player_data_testing").insert(player_data).execute()
-                            if result.data:
-                                print(f"Record synced to Supabase: {result.data}")
-                                self.local_data.synced_record(record[0])
-                            else:
-                                print("Failed to sync data.")
-                                all_synced = False
-                        except Exception as e:
-                            print(f"Failed to sync record: {record}. Error: {e}")
-                            all_synced = False
-
-                            # **Trigger the Supabase function after successful sync**
-                            if all_synced:
-                                print("All records synced successfully. Running Supabase function...")
-                                self.calculate_player_stats("calculate_player_stats")
+                    self.sync_pending()
                 else:
                     print("No internet connection detected.")
 
-                # Ensure the loop runs every 60 seconds
+                # Ensure the loop runs every sync interval, re-read so config.json changes apply
                 elapsed_time = time.time() - start_time
-                sleep_time = max(60 - elapsed_time, 0)
+                sleep_time = max(get_settings().sync.interval - elapsed_time, 0)
                 print(f"Sleeping for {sleep_time:.2f} seconds...")
-                time.sleep(sleep_time)
+                self.stop_event.wait(sleep_time)
 
             except Exception as e:
                 print(f"An unexpected error occurred in the sync thread: {e}")
+                self.stop_event.wait(1)
+        print("Sync thread stopped.")
+
+    def sync_pending(self):
+        """
+            Uploads every unsynced record, then refreshes stats and the player registry.
+
+            :return: Number of records synced.
+        """
+        data = self.local_data.fetch_all_data()
+        print(f"Fetched {len(data)} unsynced records.")
+        synced = self.upload_batches(data)
+
+        # **Trigger the Supabase function after successful sync**
+        if data and synced == len(data):
+            print("All records synced successfully. Running Supabase function...")
+            self.calculate_player_stats("calculate_player_stats")
+
+        if self.player_registry.needs_refresh():
+            self.refresh_player_registry()
+        return synced
+
+    @staticmethod
+    def record_to_player_data(record):
+        return {
+            "player_id": record[1],
+            "race_date": record[2],
+            "race_type": record[3],
+            "position": record[4],
+            "race_time": record[5],
+            "reaction_time": record[6],
+            "lap_time": record[7],
+            "track_distance": record[8],
+            "eliminated": record[9],
+        }
+
+    def upload_batches(self, data):
+        synced = 0
+        batch_size = get_settings().sync.batch_size
+        for start in range(0, len(data), batch_size):
+            if self.stop_event.is_set():
+                break
+            synced += self.upload_batch(data[start:start + batch_size])
+        print(f"Synced {synced} of {len(data)} records.")
+        return synced
+
+    def upload_batch(self, batch):
+        """
+            Uploads a batch of records, splitting it when the backend refuses it.
+
+            :return: Number of records synced.
+        """
+        if self.stop_event.is_set():
+            return 0
+        try:
+            accepted = self.insert_with_retries([self.record_to_player_data(record) for record in batch])
+        except BackendError as e:
+            if len(batch) == 1:
+                print(f"Backend refused record {batch[0][0]}, leaving it unsynced: {e}")
+                with self.sync_stats.lock:
+                    self.sync_stats.rejected += 1
+                return 0
+            # one bad record refuses the whole batch, the halves are sent on their own so only it stays unsynced
+            middle = len(batch) // 2
+            return self.upload_batch(batch[:middle]) + self.upload_batch(batch[middle:])
+
+        if not accepted:
+            print(f"Failed to sync batch of {len(batch)} records.")
+            with self.sync_stats.lock:
+                self.sync_stats.failed_batches += 1
+            return 0
+        self.local_data.synced_records([record[0] for record in batch])
+        self.sync_stats.record_batch(batch)
+        return len(batch)
+
+    def insert_with_retries(self, results):
+        """
+            Inserts a batch, retrying with exponential backoff or as long as the backend asks.
+
+            Only network errors, 429 and 5xx are retried.
+
+            :return: True if the backend accepted the batch, False if it gave up retrying.
+            :raises BackendError: If the backend refused the batch, sending it again can not succeed.
+        """
+        sync_settings = get_settings().sync
+        for attempt in range(sync_settings.max_retries + 1):
+            try:
+                self.backend.insert_results(results)
+                return True
+            except BackendError as e:
+                if not e.retryable:
+                    raise
+                if attempt == sync_settings.max_retries:
+                    print(f"Giving up on batch after {attempt + 1} attempts: {e}")
+                    return False
+                with self.sync_stats.lock:
+                    self.sync_stats.retries += 1
+                wait = e.retry_after if e.retry_after is not None else sync_settings.retry_backoff * 2 ** attempt
+                if self.stop_event.wait(wait):
+                    return False
+        return False
 
     def update_player_data(self, player_model):
+        # called from the UI, a single attempt so the window does not wait on retries
         if self.check_internet():
-            # Attempt to save directly to Supabase
-            response = supabase_client.table("player_data_testing").insert(player_model.to_sync_dict()).execute()
-            if response.data:
-                print("Successfully sync with Supabase, saving locally with synced.")
-                print(f"Player model Synced: {player_model.to_sync_dict()}")
-                self.local_data.save_locally_synced(player_model)
+            try:
+                self.backend.insert_results([player_model.to_sync_dict()])
+            except BackendError as e:
+                print(f"Failed to sync ({e}), saving locally.")
+                self.local_data.save_locally(player_model)
+                return
 
-                # **Trigger Supabase function after successful player update**
-                print("Running Supabase function after player update...")
-                self.calculate_player_stats("calculate_player_stats")
+            print("Successfully synced, saving locally with synced.")
+            print(f"Player model Synced: {player_model.to_sync_dict()}")
+            self.local_data.save_locally_synced(player_model)
 
-            else:
-                print("Failed to sync with Supabase, saving locally.")
-                self.local_data.save_locally(player_model)
+            # **Trigger Supabase function after successful player update**
+            print("Running Supabase function after player update...")
+            self.calculate_player_stats("calculate_player_stats")
         else:
             print("No internet connection, saving locally.")
             self.local_data.save_locally(player_model)
 
+    def refresh_player_registry(self):
+        """ Bulk syncs the player registry from the backend, page by page """
+        page_size = get_settings().sync.player_registry_page_size
+        try:
+            players = []
+            start = 0
+            while True:
+                page = self.backend.fetch_players(start, start + page_size - 1)
+                players.extend((row.get("player_id"), row.get("player_name")) for row in page)
+                if len(page) < page_size:
+                    break
+                start += page_size
+
+            stored = self.player_registry.replace_all(players)
+            print(f"Player registry refreshed: {stored} players.")
+        except Exception as e:
+            print(f"Failed to refresh player registry: {e}")
+
     def calculate_player_stats(self, function_name, params=None):
         """
-            Executes a stored function in Supabase.
+            Executes a stored function in the backend.
 
             :param function_name: Name of the Supabase function to call.
             :param params: Dictionary of parameters to pass to the function (if required).
             :return: Function response or error.
         """
         try:
-            if params is None:
-                params = {}
-
-            response = supabase_client.rpc(function_name, params).execute()
+            data = self.backend.call_function(function_name, params)
 
-            if response.data:
-                print(f"Function '{function_name}' executed successfully: {response.data}")
-                return response.data
+            if data:
+                print(f"Function '{function_name}' executed successfully: {data}")
+                return data
             else:
                 print(f"Function '{function_name}' executed but returned no data.")
                 return None
@@ -0,0 +1,263 @@
+import json
+import queue
+import threading
+import time
+
+import serial
+import serial.tools.list_ports
+
+from settings import get_settings
+from timing import DriftEstimator, host_now_ns, stamp_frame
+
+# USB vendor/product IDs of the boards and USB-serial chips used on the tracks,
+# a product ID of None matches every product of the vendor
+ARDUINO_USB_IDS = [
+    (0x2341, None),  # Arduino SA
+    (0x2A03, None),  # Arduino.org
+    (0x1A86, 0x7523),  # CH340 clones
+    (0x0403, 0x6001),  # FTDI FT232
+    (0x10C4, 0xEA60),  # Silicon Labs CP210x
+]
+
+
+def is_arduino(port_info):
+    for vid, pid in ARDUINO_USB_IDS:
+        if port_info.vid == vid and (pid is None or port_info.pid == pid):
+            return True
+    return False
+
+
+def is_handshake_frame(line):
+    """ A handshake frame is any JSON object the race firmware sends """
+    try:
+        data = json.loads(line)
+    except (ValueError, UnicodeDecodeError):
+        return False
+    return isinstance(data, dict) and ("status" in data or "player_info" in data)
+
+
+def probe_port(device, baud_rate, timeout=None):
+    """
+        Listens on a port for a frame from the race firmware.
+
+        :param device: Port name, e.g. COM3 or /dev/ttyACM0.
+        :param baud_rate: Baud rate of the firmware.
+        :param timeout: Seconds to wait for a frame, serial.handshake_timeout by default.
+        :return: True if a frame was received.
+    """
+    serial_settings = get_settings().serial
+    if timeout is None:
+        timeout = serial_settings.handshake_timeout
+    try:
+        with serial.Serial(device, baud_rate, timeout=serial_settings.read_timeout) as connection:
+            end = time.monotonic() + timeout
+            while time.monotonic() < end:
+                line = connection.readline()
+                if line and is_handshake_frame(line.decode(errors="ignore").strip()):
+                    return True
+    except (serial.SerialException, OSError):
+        pass
+    return False
+
+
+def discover_port(baud_rate, stop_event=None):
+    """
+        Finds the race Arduino, first by USB ID, then by listening for a handshake frame.
+
+        :return: Port name, or None if no board was found.
+    """
+    ports = serial.tools.list_ports.comports()
+    for port_info in ports:
+        print(port_info)
+
+    for port_info in ports:
+        if is_arduino(port_info):
+            return port_info.device
+
+    for port_info in ports:
+        if stop_event is not None and stop_event.is_set():
+            return None
+        if probe_port(port_info.device, baud_rate):
+            return port_info.device
+    return None
+
+
+class SerialCommunication:
+    """
+        Reads JSON frames from the race Arduino on a background thread.
+
+        When no port is given the board is discovered automatically. If the cable
+        is unplugged the reader reconnects with backoff. Complete frames are queued
+        and dispatched from a separate thread, so slow callbacks never hold up
+        reading and frames received before a disconnect are still delivered.
+    """
+
+    def __init__(self, port, baud_rate, update_callback, messagebox_callback,
+                 status_update_label_callback, comport_connected_label_callback, lifecycle=None,
+                 connection_status_callback=None, start=True):
+        self.port = port
+        self.auto_discover = port is None
+        self.baud_rate = baud_rate
+        self.update_callback = update_callback
+        self.status_update_label_callback = status_update_label_callback
+        self.comport_connected_label_callback = comport_connected_label_callback
+        self.messagebox_callback = messagebox_callback
+        self.connection_status_callback = connection_status_callback
+        self.serial = None
+        self.stop_event = threading.Event()
+
+        # complete lines with their arrival time waiting to be dispatched, None wakes the dispatcher on stop
+        self.frames = queue.Queue()
+
+        # compares the Arduino's clock with the host's across frames
+        self.drift_estimator = DriftEstimator()
+
+        # reconnect statistics shown in the UI
+        self.connected = False
+        self.reconnect_count = 0
+        self.last_reconnect_seconds = None
+
+        # start=False leaves the port closed, frames can then be replayed through dispatch()
+        if not start:
+            self.read_thread = None
+            self.dispatch_thread = None
+            return
+
+        # starting thread to fetch data from arduino
+        self.read_thread = threading.Thread(target=self.run)
+        self.read_thread.daemon = True
+        self.read_thread.start()
+
+        self.dispatch_thread = threading.Thread(target=self.dispatch_frames)
+        self.dispatch_thread.daemon = True
+        self.dispatch_thread.start()
+
+        if lifecycle is not None:
+            # the reader is stopped first and wakes the dispatcher once its last frame is queued
+            lifecycle.register("serial dispatcher", thread=self.dispatch_thread)
+            lifecycle.register("serial reader", stop=self.stop, thread=self.read_thread, close=self.close)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def close(self):
+        # release the port so the next launch can open it straight away
+        if self.serial is not None and self.serial.is_open:
+            self.serial.close()
+            print(f"Closed {self.port}")
+
+    def notify_status(self, message):
+        print(message)
+        if self.connection_status_callback is not None:
+            self.connection_status_callback(self.connected, message)
+
+    def open_port(self):
+        if self.auto_discover:
+            self.port = discover_port(self.baud_rate, self.stop_event)
+            if self.port is None:
+                raise serial.SerialException("No Arduino found")
+        # the read timeout bounds how long the reader takes to notice a stop request
+        self.serial = serial.Serial(self.port, self.baud_rate, timeout=get_settings().serial.read_timeout)
+
+    def run(self):
+        try:
+            self.connect_and_read()
+        finally:
+            self.frames.put(None)
+
+    def connect_and_read(self):
+        # reconnect backoff in seconds, doubled after every failed attempt
+        backoff = get_settings().serial.reconnect_backoff_min
+        disconnected_at = None
+        connected_once = False
+
+        while not self.stop_event.is_set():
+            try:
+                self.open_port()
+            except (serial.SerialException, OSError) as e:
+                if not connected_once and not self.auto_discover:
+                    # a wrong COM number typed by the operator is reported instead of retried
+                    print(f"Exception: {e}")
+                    self.messagebox_callback(e, False)
+                    return
+                self.notify_status(f"Waiting for Arduino, retrying in {backoff:.1f} s")
+                self.stop_event.wait(backoff)
+                backoff = min(backoff * 2, get_settings().serial.reconnect_backoff_max)
+                continue
+
+            self.connected = True
+            backoff = get_settings().serial.reconnect_backoff_min
+
+            if not connected_once:
+                connected_once = True
+                self.comport_connected_label_callback()
+                self.messagebox_callback(f'Connected to {self.serial.port}', True)
+                self.notify_status(f"Connected to {self.port}")
+            else:
+                self.reconnect_count += 1
+                self.last_reconnect_seconds = time.perf_counter() - disconnected_at
+                self.notify_status(f"Reconnected to {self.port} in {self.last_reconnect_seconds:.2f} s")
+
+            try:
+                self.read_serial_data()
+            except (serial.SerialException, OSError) as e:
+                print(f"Serial connection lost: {e}")
+
+            self.connected = False
+            disconnected_at = time.perf_counter()
+            self.close()
+            if not self.stop_event.is_set():
+                self.notify_status(f"Disconnected from {self.port}, reconnecting")
+
+    def read_serial_data(self):
+        buffer = bytearray()
+        while not self.stop_event.is_set():
+            # read whatever arrived, waiting up to the timeout for at least one byte
+            chunk = self.serial.read(self.serial.in_waiting or 1)
+            if not chunk:
+                continue
+            # every line completed by this chunk arrived now
+            arrival_ns = host_now_ns()
+            buffer.extend(chunk)
+
+            while True:
+                newline = buffer.find(b"\n")
+                if newline < 0:
+                    break
+                line = bytes(buffer[:newline])
+                del buffer[:newline + 1]
+                self.frames.put((line.decode(errors="replace").strip(), arrival_ns))
+
+        # a partial line cut off by a disconnect can not be completed by the next connection
+        if buffer:
+            print(f"Discarding partial frame: {bytes(buffer)}")
+
+    def dispatch_frames(self):
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            self.dispatch(*frame)
+
+    def dispatch(self, data, arrival_ns=None):
+        try:
+            received_data = json.loads(data)  # Assuming data is in JSON format
+            if isinstance(received_data, dict):
+                stamp_frame(received_data, arrival_ns or host_now_ns(), self.drift_estimator)
+
+                # To display players data
+                if "player_info" in received_data:
+                    self.update_callback(received_data)
+
+                # updating the label based on the game
+                if "status" in received_data:
+                    self.status_update_label_callback(received_data)
+
+            else:
+                pass
+
+        except json.JSONDecodeError as e:
+            print("JSON decode error:", e)
+            print(data)
+        except Exception as e:
+            print("Error:", e)
@@ -0,0 +1,292 @@
+import dataclasses
+import json
+import math
+import os
+import sys
+import threading
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+
+def app_directory():
+    # next to the executable in the PyInstaller bundle, so config.json can be edited without a rebuild
+    if getattr(sys, "frozen", False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+CONFIG_PATH = os.path.join(app_directory(), "config.json")
+
+# seconds between checks of config.json for changes
+WATCH_INTERVAL = 2.0
+
+
+@dataclass(frozen=True)
+class SerialSettings:
+    baud_rate: int = 9600
+    # COM port used when the sidebar entry is left blank, None searches for the Arduino
+    port: Optional[str] = None
+    read_timeout: float = 0.5
+    handshake_timeout: float = 3.0
+    reconnect_backoff_min: float = 0.5
+    reconnect_backoff_max: float = 5.0
+
+
+@dataclass(frozen=True)
+class DatabaseSettings:
+    # read at startup, changing it needs a restart
+    path: str = "local_data.db"
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    cache_size: int = -2000
+    max_batch: int = 256
+
+
+@dataclass(frozen=True)
+class BackupSettings:
+    directory: str = "backups"
+    # seconds between automatic backups, None only backs up on request
+    interval: Optional[float] = None
+    # backups kept in the directory, the oldest are deleted first
+    keep: int = 10
+    # pages copied per step and the pause after each, keeping the disk free for race writes
+    pages_per_step: int = 64
+    step_pause: float = 0.02
+    # rows written between pauses of an export
+    export_rows_per_step: int = 500
+
+
+@dataclass(frozen=True)
+class SyncSettings:
+    # "supabase", or "stand_in" for the local stand-in server at stand_in_url
+    backend: str = "supabase"
+    stand_in_url: str = "http://127.0.0.1:8787"
+    interval: float = 60.0
+    batch_size: int = 200
+    # retries of a failed batch within one sync, waiting retry_backoff seconds doubled per retry
+    max_retries: int = 3
+    retry_backoff: float = 0.5
+    # ingest endpoint accepting grouped, compressed uploads, None inserts rows into Supabase
+    ingest_url: Optional[str] = None
+    results_table: str = "player_data_testing"
+    player_registry_table: str = "players"
+    player_registry_page_size: int = 1000
+    registry_refresh_interval: float = 6 * 60 * 60
+    registry_evict_after: float = 30 * 24 * 60 * 60
+
+
+@dataclass(frozen=True)
+class UISettings:
+    race_type: str = "Gravity car"
+    ready_headline: str = "Get Ready Drivers"
+    race_types: List[str] = field(default_factory=lambda: ["Jet", "Plane", "Co2 Car", "Gravity car",
+                                                           "Walk along glider", "Jet glider"])
+    headlines: List[str] = field(default_factory=lambda: ["Get Ready Pilots", "Get Ready Drivers"])
+    # prefill the sidebar with the track distance, country and city of the last session
+    remember_session: bool = True
+    shutdown_deadline: float = 5.0
+    # refresh rate of the display the race is shown on, animations are timed to its frames
+    frame_rate: int = 60
+
+
+@dataclass(frozen=True)
+class Settings:
+    serial: SerialSettings = field(default_factory=SerialSettings)
+    database: DatabaseSettings = field(default_factory=DatabaseSettings)
+    sync: SyncSettings = field(default_factory=SyncSettings)
+    backup: BackupSettings = field(default_factory=BackupSettings)
+    ui: UISettings = field(default_factory=UISettings)
+
+
+# Smallest accepted value of numeric settings, lower values would stall or crash the loop using them
+MINIMUMS = {
+    "serial.baud_rate": 1,
+    "serial.read_timeout": 0.01,
+    "serial.handshake_timeout": 0.01,
+    "serial.reconnect_backoff_min": 0,
+    "serial.reconnect_backoff_max": 0,
+    "database.max_batch": 1,
+    "backup.interval": 1,
+    "backup.keep": 1,
+    "backup.pages_per_step": 1,
+    "backup.step_pause": 0,
+    "backup.export_rows_per_step": 1,
+    "sync.interval": 1,
+    "sync.batch_size": 1,
+    "sync.max_retries": 0,
+    "sync.retry_backoff": 0,
+    "sync.player_registry_page_size": 1,
+    "sync.registry_refresh_interval": 0,
+    "sync.registry_evict_after": 0,
+    "ui.shutdown_deadline": 0,
+    "ui.frame_rate": 1,
+}
+
+# Settings interpolated into PRAGMA statements, only these values are accepted
+CHOICES = {
+    "database.journal_mode": ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"),
+    "database.synchronous": ("OFF", "NORMAL", "FULL", "EXTRA"),
+}
+
+
+def convert(value, field_type, name):
+    """ Converts a JSON value to the field type, raising ValueError when it can not """
+    if field_type is Optional[str]:
+        return None if value in (None, "") else str(value)
+    if field_type is Optional[float]:
+        if value in (None, ""):
+            return None
+        field_type = float
+    if field_type is List[str]:
+        if not isinstance(value, list):
+            raise ValueError(f"{name} must be a list")
+        return [str(item) for item in value]
+    if field_type is bool:
+        if not isinstance(value, bool):
+            raise ValueError(f"{name} must be true or false")
+        return value
+
+    value = field_type(value)
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ValueError(f"{name} must be a finite number")
+    if name in MINIMUMS and value is not None and value < MINIMUMS[name]:
+        raise ValueError(f"{name} must be at least {MINIMUMS[name]}")
+    if name in CHOICES:
+        value = value.upper()
+        if value not in CHOICES[name]:
+            raise ValueError(f"{name} must be one of {', '.join(CHOICES[name])}")
+    return value
+
+
+def build_section(section_type, values, section_name):
+    kwargs = {}
+    if not isinstance(values, dict):
+        print(f"Invalid settings section {section_name}, using the defaults: expected an object")
+        values = {}
+    fields = {section_field.name: section_field for section_field in dataclasses.fields(section_type)}
+    for name, value in values.items():
+        if name not in fields:
+            print(f"Unknown setting {section_name}.{name} ignored")
+            continue
+        try:
+            kwargs[name] = convert(value, fields[name].type, f"{section_name}.{name}")
+        except (TypeError, ValueError) as e:
+            print(f"Invalid setting {section_name}.{name}={value!r}, using the default: {e}")
+    return section_type(**kwargs)
+
+
+def parse_settings(data):
+    """
+        Builds Settings from the parsed config.json.
+
+        The top level race_type and ready_headline keys of the original config are still read.
+        Raises ValueError if the top level is not an object.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("config.json must contain an object")
+    ui = data.get("ui", {})
+    if isinstance(ui, dict):
+        ui = dict(ui)
+        for legacy_key in ("race_type", "ready_headline"):
+            if legacy_key in data:
+                ui.setdefault(legacy_key, data[legacy_key])
+
+    return Settings(
+        serial=build_section(SerialSettings, data.get("serial", {}), "serial"),
+        database=build_section(DatabaseSettings, data.get("database", {}), "database"),
+        sync=build_section(SyncSettings, data.get("sync", {}), "sync"),
+        backup=build_section(BackupSettings, data.get("backup", {}), "backup"),
+        ui=build_section(UISettings, ui, "ui"),
+    )
+
+
+def load_settings(path=CONFIG_PATH):
+    try:
+        with open(path, encoding="utf-8") as config_file:
+            data = json.load(config_file)
+    except FileNotFoundError:
+        print(f"{path} not found, using default settings")
+        return Settings()
+    return parse_settings(data)
+
+
+_settings = None
+_settings_lock = threading.Lock()
+_listeners = []
+
+
+def get_settings():
+    """ Settings loaded once and cached, replaced when config.json changes """
+    global _settings
+    if _settings is None:
+        with _settings_lock:
+            if _settings is None:
+                try:
+                    _settings = load_settings()
+                except (OSError, ValueError) as e:
+                    # a broken config.json must not keep the app from starting
+                    print(f"Failed to load {CONFIG_PATH}, using default settings: {e}")
+                    _settings = Settings()
+    return _settings
+
+
+def add_listener(listener):
+    """ listener(settings) is called on the watcher thread after every reload """
+    _listeners.append(listener)
+
+
+def reload_settings(path=CONFIG_PATH):
+    """
+        Reloads config.json. A file that fails to parse keeps the current settings.
+
+        :return: The settings in effect after the reload.
+    """
+    global _settings
+    try:
+        settings = load_settings(path)
+    except (OSError, ValueError) as e:
+        print(f"Failed to reload {path}, keeping the current settings: {e}")
+        return get_settings()
+
+    with _settings_lock:
+        _settings = settings
+    print(f"Settings reloaded from {path}")
+    for listener in _listeners:
+        try:
+            listener(settings)
+        except Exception as e:
+            print(f"Error applying settings: {e}")
+    return settings
+
+
+class SettingsWatcher:
+    """ Polls config.json and reloads the settings when it changes """
+
+    def __init__(self, path=CONFIG_PATH, interval=WATCH_INTERVAL, lifecycle=None):
+        self.path = path
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.last_modified = self.modified_time()
+
+        self.thread = threading.Thread(target=self.run, name="settings watcher")
+        self.thread.daemon = True
+        self.thread.start()
+
+        if lifecycle is not None:
+            lifecycle.register("settings watcher", stop=self.stop, thread=self.thread)
+
+    def modified_time(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            modified = self.modified_time()
+            if modified != self.last_modified:
+                self.last_modified = modified
+                reload_settings(self.path)
@@ -0,0 +1,257 @@
+import argparse
+import json
+import random
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from payload_encoding import CONTENT_TYPE, RESULT_FIELDS, SESSION_FIELDS, decode_results
+
+# Columns of the stored results, in the order they are inserted
+RESULT_COLUMNS = SESSION_FIELDS + RESULT_FIELDS
+
+# Columns refusing anything but numbers, like the typed columns of the remote table
+NUMERIC_COLUMNS = ("track_distance", "position", "race_time", "reaction_time", "lap_time", "eliminated")
+
+
+def check_results(results):
+    """ Raises ValueError for the first result the remote table would refuse, the whole batch is refused """
+    for result in results:
+        for column in NUMERIC_COLUMNS:
+            value = result.get(column)
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                raise ValueError(f"{column} must be a number, got {value!r}")
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+        Accepts result uploads the way the remote ingest endpoint does and counts the bytes received.
+
+        Also answers the player registry and stored function calls of the remote backend, so
+        the whole sync path can run against it offline.
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            self.send_json(200, {"ok": True})
+            return
+        if not self.admit():
+            return
+
+        if url.path == "/players":
+            query = parse_qs(url.query)
+            start = int(query.get("start", ["0"])[0])
+            end = int(query.get("end", [str(start + 999)])[0])
+            self.send_json(200, self.server.players(start, end))
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+
+        # request line, headers and body as received on the wire
+        header_bytes = len(self.requestline) + 2 + len(str(self.headers).encode("latin-1"))
+        self.server.record_upload(header_bytes + length)
+        if not self.admit():
+            return
+
+        if self.path.startswith("/rpc/"):
+            self.send_json(200, self.server.call_function(self.path[len("/rpc/"):]))
+            return
+        if self.path != "/results":
+            self.send_json(404, {"error": "not found"})
+            return
+
+        try:
+            if self.headers.get("Content-Type", "").startswith(CONTENT_TYPE):
+                compressed = self.headers.get("Content-Encoding") == "gzip"
+                results = decode_results(body, compressed=compressed)
+            else:
+                results = json.loads(body.decode("utf-8"))
+                if isinstance(results, dict):
+                    results = [results]
+            check_results(results)
+        except (ValueError, KeyError) as e:
+            self.send_json(400, {"error": str(e)})
+            return
+
+        self.server.store_results(results)
+        self.send_json(201, {"inserted": len(results)})
+
+    def admit(self):
+        """ Applies the injected latency, rate limit and errors, answering the request if it is refused """
+        refusal = self.server.admit()
+        if refusal is None:
+            return True
+        status, retry_after = refusal
+        headers = {"Retry-After": f"{retry_after:.3f}"} if retry_after is not None else {}
+        self.send_json(status, {"error": "rate limited" if status == 429 else "injected error"}, headers)
+        return False
+
+    def send_json(self, status, body, headers=None):
+        response = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        # keep benchmark output readable
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+        Local stand-in for the remote backend, storing results in sqlite.
+
+        :param latency: Seconds added to every request, plus up to jitter seconds at random.
+        :param error_rate: Fraction of requests answered with 503.
+        :param rate_limit: Requests per second accepted, the rest get 429 with Retry-After. None is unlimited.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, db_path=":memory:", latency=0.0, jitter=0.0,
+                 error_rate=0.0, rate_limit=None):
+        super().__init__((host, port), StandInHandler)
+        self.lock = threading.Lock()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.thread = None
+
+        # token bucket holding up to one second of requests
+        self.tokens = rate_limit or 0
+        self.last_refill = time.monotonic()
+
+        self.bytes_received = 0
+        self.requests_received = 0
+        self.errors_injected = 0
+        self.rate_limited = 0
+
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute(f'''
+            CREATE TABLE IF NOT EXISTS results (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                {", ".join(RESULT_COLUMNS)},
+                received_at REAL)
+        ''')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS players (
+                player_id TEXT PRIMARY KEY,
+                player_name TEXT)
+        ''')
+        self.db.commit()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def url(self):
+        return f"{self.base_url}/results"
+
+    def admit(self):
+        """ :return: None to serve the request, or the (status, retry_after) it is refused with. """
+        delay = self.latency + random.uniform(0, self.jitter) if self.latency or self.jitter else 0
+        if delay:
+            time.sleep(delay)
+
+        with self.lock:
+            if self.rate_limit:
+                now = time.monotonic()
+                self.tokens = min(self.tokens + (now - self.last_refill) * self.rate_limit, self.rate_limit)
+                self.last_refill = now
+                if self.tokens < 1:
+                    self.rate_limited += 1
+                    return 429, (1 - self.tokens) / self.rate_limit
+                self.tokens -= 1
+
+            if self.error_rate and random.random() < self.error_rate:
+                self.errors_injected += 1
+                return 503, None
+        return None
+
+    def record_upload(self, num_bytes):
+        with self.lock:
+            self.bytes_received += num_bytes
+            self.requests_received += 1
+
+    def store_results(self, results):
+        received_at = time.time()
+        rows = [tuple(result.get(column) for column in RESULT_COLUMNS) + (received_at,) for result in results]
+        with self.lock:
+            self.db.executemany(f"INSERT INTO results ({', '.join(RESULT_COLUMNS)}, received_at) "
+                                f"VALUES ({', '.join('?' * (len(RESULT_COLUMNS) + 1))})", rows)
+            self.db.commit()
+
+    @property
+    def results(self):
+        with self.lock:
+            rows = self.db.execute(f"SELECT {', '.join(RESULT_COLUMNS)} FROM results ORDER BY id").fetchall()
+        return [dict(zip(RESULT_COLUMNS, row)) for row in rows]
+
+    def result_count(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def add_players(self, players):
+        """ :param players: Iterable of (player_id, player_name). """
+        with self.lock:
+            self.db.executemany("INSERT OR REPLACE INTO players (player_id, player_name) VALUES (?, ?)", players)
+            self.db.commit()
+
+    def players(self, start, end):
+        with self.lock:
+            rows = self.db.execute("SELECT player_id, player_name FROM players ORDER BY player_id "
+                                   "LIMIT ? OFFSET ?", (max(end - start + 1, 0), start)).fetchall()
+        return [{"player_id": player_id, "player_name": player_name} for player_id, player_name in rows]
+
+    def call_function(self, function_name):
+        # stored functions are not modelled, answering like one that ran keeps the sync loop going
+        return [{"function": function_name, "results": self.result_count()}]
+
+    def reset_counters(self):
+        with self.lock:
+            self.db.execute("DELETE FROM results")
+            self.db.commit()
+            self.bytes_received = 0
+            self.requests_received = 0
+            self.errors_injected = 0
+            self.rate_limited = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the remote backend")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--db", default="stand_in.db")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra seconds up to this")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--rate-limit", type=float, default=None, help="requests per second before 429")
+    args = parser.parse_args()
+
+    server = StandInServer(port=args.port, db_path=args.db, latency=args.latency, jitter=args.jitter,
+                           error_rate=args.error_rate, rate_limit=args.rate_limit)
+    print(f"Stand-in backend listening on {server.base_url}, results stored in {args.db}")
+    server.serve_forever()
@@ -0,0 +1,122 @@
+import time
+
+# Frame field carrying the Arduino's millis() clock, when the firmware sends it
+DEVICE_TIME_KEY = "device_time"
+
+# Timings measured by the Arduino's clock that get a drift corrected copy
+TIMED_FIELDS = ("race_time", "reaction_time", "lap_time")
+
+# Samples needed before the estimated rate is trusted
+MIN_SAMPLES = 8
+
+
+# Offset from perf_counter_ns to wall clock nanoseconds, taken once so stored
+# arrival times can be compared across restarts and tracks
+WALL_CLOCK_OFFSET_NS = time.time_ns() - time.perf_counter_ns()
+
+
+def host_now_ns():
+    return time.perf_counter_ns()
+
+
+def to_wall_clock_ns(host_ns):
+    if host_ns is None:
+        return None
+    return host_ns + WALL_CLOCK_OFFSET_NS
+
+
+class DriftEstimator:
+    """
+        Online least squares fit of host arrival time against device time.
+
+        The slope is how many host seconds pass per device second, so a device
+        duration multiplied by it is the same duration on the host clock. Only
+        running sums are kept, each sample is a handful of additions.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.origin_device_ms = None
+        self.origin_host_ns = None
+        self.last_device_ms = None
+        self.sum_x = 0.0
+        self.sum_y = 0.0
+        self.sum_xx = 0.0
+        self.sum_xy = 0.0
+
+    def add(self, device_ms, host_ns):
+        """
+            Adds a frame's device timestamp and the host time it arrived.
+
+            :param device_ms: Device clock in milliseconds.
+            :param host_ns: Host perf_counter_ns at arrival.
+        """
+        if self.last_device_ms is not None and device_ms < self.last_device_ms:
+            # the Arduino restarted or millis() wrapped, start a new fit
+            self.reset()
+        if self.origin_device_ms is None:
+            self.origin_device_ms = device_ms
+            self.origin_host_ns = host_ns
+        self.last_device_ms = device_ms
+
+        # milliseconds relative to the first sample keep the sums small and precise
+        x = device_ms - self.origin_device_ms
+        y = (host_ns - self.origin_host_ns) / 1_000_000
+        self.count += 1
+        self.sum_x += x
+        self.sum_y += y
+        self.sum_xx += x * x
+        self.sum_xy += x * y
+
+    @property
+    def rate(self):
+        """ Host seconds per device second, 1.0 until enough samples arrived """
+        if self.count < MIN_SAMPLES:
+            return 1.0
+        denominator = self.count * self.sum_xx - self.sum_x * self.sum_x
+        if denominator <= 0:
+            return 1.0
+        return (self.count * self.sum_xy - self.sum_x * self.sum_y) / denominator
+
+    @property
+    def drift_ppm(self):
+        return (self.rate - 1.0) * 1_000_000
+
+    def correct(self, duration):
+        """ Converts a duration measured by the device clock to host time """
+        if duration is None or isinstance(duration, str):
+            return duration
+        return duration * self.rate
+
+    def to_host_ns(self, device_ms):
+        """ Host perf_counter_ns at which the device clock read device_ms """
+        if self.count < MIN_SAMPLES:
+            return None
+        rate = self.rate
+        intercept = (self.sum_y - rate * self.sum_x) / self.count
+        return self.origin_host_ns + int((intercept + rate * (device_ms - self.origin_device_ms)) * 1_000_000)
+
+
+def stamp_frame(frame, host_ns, estimator):
+    """
+        Records the arrival time on a frame and adds drift corrected timings to its player info.
+
+        :param frame: Decoded JSON frame from the Arduino.
+        :param host_ns: Host perf_counter_ns at which the frame's last byte arrived.
+        :param estimator: DriftEstimator fed with every frame carrying a device time.
+    """
+    frame["host_received_ns"] = host_ns
+
+    device_ms = frame.get(DEVICE_TIME_KEY)
+    if isinstance(device_ms, (int, float)):
+        estimator.add(device_ms, host_ns)
+
+    player_info = frame.get("player_info")
+    if isinstance(player_info, dict):
+        player_info["host_received_ns"] = host_ns
+        for field in TIMED_FIELDS:
+            if field in player_info:
+                player_info[f"{field}_corrected"] = estimator.correct(player_info[field])